@@ -1,312 +1,1113 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import requests
 import os
+import json
 import urllib.parse
 import time
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from match_store import MatchStore, MATCH_STORE_DIR
+from rate_limiter import RateLimiter, parse_rate_limits, endpoint_key
+from single_flight import SingleFlight
+from player_cache import PlayerCache, FRESH, STALE
+from match_history import MatchHistory, main_role as most_played_role
+from match_parser import parse_match
+from champions_cache import ChampionsCache, DDRAGON_URL
+from encoded_body import EncodedBody, dumps
+from metrics import REGISTRY, TRACE_ID, new_trace_id, log, submit
+from fetch_graph import FetchGraph
+from deadline import deadline as request_deadline, no_deadline, remaining, bounded
 
 app = Flask(__name__)
 CORS(app)
 
 # --- IN-MEMORY CACHE SYSTEM ---
-# Almacena los datos de los jugadores para no saturar la API
-PLAYER_CACHE = {}
+# Almacena los datos de los jugadores para no saturar la API (LRU acotada, ver player_cache.py)
 CACHE_DURATION = 3600  # 1 hora en segundos (ajusta este valor si quieres más/menos tiempo)
+STALE_CACHE_DURATION = 86400  # Hasta 24h servimos el dato viejo al momento y refrescamos en segundo plano
+PLAYER_CACHE = PlayerCache(
+    fresh_ttl=CACHE_DURATION,
+    stale_ttl=STALE_CACHE_DURATION,
+    max_entries=int(os.environ.get('PLAYER_CACHE_MAX_ENTRIES', 500)),
+    max_bytes=int(os.environ.get('PLAYER_CACHE_MAX_BYTES', 0)),
+)
 
-# --- CHAMPIONS CACHE ---
-CHAMPIONS_CACHE = {
-    "data": [],
-    "timestamp": 0
+# --- INCREMENTAL REFRESH ---
+ACCOUNT_TTL = 30 * 86400  # El PUUID de un name#tag prácticamente no cambia
+FULL_REFRESH_INTERVAL = 86400  # Cada 24h refrescamos nivel/ranked aunque no haya partidas nuevas
+INCREMENTAL_REFRESH = os.environ.get('INCREMENTAL_REFRESH', '1') != '0'
+
+# --- DEEP SEASON HISTORY ---
+# /api/player?history=season pagina match-ids desde SEASON_START (epoch en segundos)
+SEASON_START = int(os.environ.get('SEASON_START', 1767830400))  # 2026-01-08, inicio de la temporada
+DEEP_HISTORY_MAX_GAMES = int(os.environ.get('DEEP_HISTORY_MAX_GAMES', 300))
+# Parte del presupuesto de la app que puede gastar el historial de temporada: lo que no quepa se
+# queda para la siguiente petición (partial) en vez de dejar sin llamadas al resto del roster
+SEASON_RATE_SHARE = float(os.environ.get('SEASON_RATE_SHARE', 0.25))
+
+# --- MATCH STORE ---
+# Partidas ya procesadas (persistente entre reinicios, ver match_store.py)
+MATCH_STORE = MatchStore()
+
+# --- RIOT RATE BUDGET ---
+# Presupuesto compartido de peticiones simultáneas a Riot (todas las rutas y todos los hilos)
+RIOT_MAX_CONCURRENCY = int(os.environ.get('RIOT_MAX_CONCURRENCY', 10))
+RIOT_SEMAPHORE = threading.BoundedSemaphore(RIOT_MAX_CONCURRENCY)
+# Límites de una development key hasta que Riot nos diga los reales en las cabeceras
+RIOT_LIMITER = RateLimiter(parse_rate_limits(os.environ.get('RIOT_APP_RATE_LIMIT', '20:1,100:120')))
+MAX_RATE_LIMIT_WAIT = 10  # Si hay que esperar más, abortamos para no colgar Vercel
+SEASON_LIMITER = RateLimiter([
+    (max(1, int(amount * SEASON_RATE_SHARE)), window) for amount, window in RIOT_LIMITER.default_app_limits
+])
+
+# --- ROSTER TRACKING ---
+# puuid -> cache_key de los jugadores ya servidos: una partida descargada para uno de ellos
+# alimenta también al resto que jugó en ella (ver feed_tracked_players).
+# Se deja de seguir a un jugador cuando su entrada sale de PLAYER_CACHE, así que no crece sin límite.
+TRACKED_PLAYERS = {}
+
+def untrack_players(cache_keys):
+    """PLAYER_CACHE on_evict callback: stops tracking the players whose entries were evicted."""
+    evicted = set(cache_keys)
+    for puuid, cache_key in list(TRACKED_PLAYERS.items()):
+        if cache_key in evicted:
+            TRACKED_PLAYERS.pop(puuid, None)
+
+PLAYER_CACHE.on_evict = untrack_players
+
+# --- SINGLE-FLIGHT ---
+# Peticiones simultáneas al mismo jugador / misma URL comparten una sola llamada en curso
+PLAYER_FLIGHT = SingleFlight()
+UPSTREAM_FLIGHT = SingleFlight()
+
+# --- BATCH LEADERBOARD ---
+BATCH_MAX_PLAYERS = 20  # Máximo de jugadores por petición a /api/players
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 5))
+
+# --- PIPELINE ENGINE ---
+# "threads" (por defecto): requests + pools de hilos. "async": asyncio + aiohttp (ver async_pipeline.py,
+# sin timeouts por nodo, hedging ni backfill inmediato de respuestas parciales)
+PIPELINE_ENGINE = os.environ.get('PIPELINE_ENGINE', 'threads')
+
+# --- ROSTER SCHEDULER ---
+CRON_MAX_PLAYERS = int(os.environ.get('CRON_MAX_PLAYERS', 4))  # Jugadores por pasada de /api/cron/refresh
+
+# --- RIOT HOSTS ---
+# Configurables para apuntar a un servidor falso (ver benchmark.py / fake_riot.py)
+RIOT_REGION_URL = os.environ.get('RIOT_REGION_URL', 'https://europe.api.riotgames.com')  # account-v1, match-v5
+RIOT_PLATFORM_URL = os.environ.get('RIOT_PLATFORM_URL', 'https://euw1.api.riotgames.com')  # summoner-v4, league-v4
+
+# --- SHARED HTTP CLIENT & WORKER POOLS ---
+# Una sola sesión con keep-alive: reutilizamos las conexiones TCP+TLS con cada host
+# en vez de abrir una nueva en cada llamada. Viven lo que vive el proceso (instancias warm).
+HTTP_SESSION = requests.Session()
+for host in (RIOT_REGION_URL, RIOT_PLATFORM_URL):
+    HTTP_SESSION.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=RIOT_MAX_CONCURRENCY))
+HTTP_SESSION.mount(DDRAGON_URL, HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+# Timeout de cada nodo del grafo de llamadas de un jugador (ver fetch_graph.py)
+FETCH_NODE_TIMEOUT = float(os.environ.get('FETCH_NODE_TIMEOUT', 12))
+
+# --- REQUEST DEADLINE & HEDGING ---
+# Presupuesto total de /api/player, /api/players y /api/players/stream (ver deadline.py): cada
+# llamada a Riot recorta sus timeouts y esperas a lo que queda y, si se acaba, respondemos con
+# lo que haya llegado marcado como "partial" y completamos el resto en segundo plano.
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 8))  # 0 = sin deadline
+# Una partida que tarda más que esto se pide otra vez en paralelo y gana la primera respuesta
+MATCH_HEDGE_AFTER = float(os.environ.get('MATCH_HEDGE_AFTER', 1.5))  # 0 = sin hedging
+
+# RIOT_EXECUTOR sólo ejecuta llamadas hoja (fetch_data / fetch_and_process_match) y
+# PLAYER_EXECUTOR pipelines completos que esperan a RIOT_EXECUTOR: separados para no bloquearse.
+WORKER_POOL_SIZE = int(os.environ.get('WORKER_POOL_SIZE', 10))
+RIOT_EXECUTOR = ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, thread_name_prefix="riot")
+PLAYER_EXECUTOR = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="player")
+# El historial de temporada (cientos de partidas por jugador) va en sus propios pools pequeños:
+# en RIOT_EXECUTOR dejaría a los grafos de todos los demás jugadores en cola detrás de él
+SEASON_MAX_WORKERS = int(os.environ.get('SEASON_MAX_WORKERS', 2))
+SEASON_EXECUTOR = ThreadPoolExecutor(max_workers=SEASON_MAX_WORKERS, thread_name_prefix="season")
+SEASON_PIPELINE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="season-pipeline")
+
+TIER_VALUES = {
+    "CHALLENGER": 90, "GRANDMASTER": 80, "MASTER": 70,
+    "DIAMOND": 60, "EMERALD": 50, "PLATINUM": 40,
+    "GOLD": 30, "SILVER": 20, "BRONZE": 10, "IRON": 0,
+    "UNRANKED": -10
 }
+RANK_VALUES = {"I": 1, "II": 2, "III": 3, "IV": 4, "1": 1, "2": 2, "3": 3, "4": 4}
+# Campos de build_player_response() que salen de league-v4
+RANKED_FIELDS = (
+    "tier", "rank", "lp", "wins", "losses", "ladder_rank", "ranked_flex",
+    "past_rank", "past_ranks", "hot_streak", "veteran", "fresh_blood",
+)
+
+# --- CHAMPIONS CACHE ---
+# Persistida en disco junto al match store y refrescada en segundo plano (ver champions_cache.py)
+CHAMPIONS_CACHE = ChampionsCache(HTTP_SESSION, MATCH_STORE_DIR)
+if not CHAMPIONS_CACHE.names():
+    CHAMPIONS_CACHE.refresh_in_background()  # Primer arranque sin copia en disco: calentamos ya
+
+# --- METRICS ---
+# Expuestas en /api/metrics (formato Prometheus, ver metrics.py). TRACE_LOGS=1 añade un trace id
+# por petición a los logs (cabecera X-Request-ID si viene, si no uno nuevo) y lo devuelve en X-Trace-Id.
+TRACE_LOGS = os.environ.get('TRACE_LOGS') == '1'
+HTTP_SECONDS = REGISTRY.histogram("soloq_http_request_seconds", "Flask request latency by endpoint.", ("endpoint",))
+HTTP_REQUESTS = REGISTRY.counter("soloq_http_requests_total", "Flask responses by endpoint and status.", ("endpoint", "status"))
+STAGE_SECONDS = REGISTRY.histogram("soloq_stage_seconds", "Latency of each player pipeline stage.", ("stage",))
+UPSTREAM_SECONDS = REGISTRY.histogram("soloq_upstream_seconds", "Riot API call latency by endpoint family.", ("family",))
+UPSTREAM_REQUESTS = REGISTRY.counter("soloq_upstream_requests_total", "Riot API responses by endpoint family and status.", ("family", "status"))
+UPSTREAM_RETRIES = REGISTRY.counter("soloq_upstream_retries_total", "Riot API retries by endpoint family and reason.", ("family", "reason"))
+RATE_LIMIT_WAIT = REGISTRY.counter("soloq_rate_limit_wait_seconds_total", "Time spent waiting for the rate limiter.", ("family",))
+RETRY_AFTER = REGISTRY.counter("soloq_retry_after_seconds_total", "Retry-After seconds requested by Riot 429s.", ("family",))
+FETCH_HEDGES = REGISTRY.counter("soloq_fetch_hedges_total", "Duplicate requests launched for straggling tasks.", ("node",))
+DEADLINE_EXCEEDED = REGISTRY.counter("soloq_deadline_exceeded_total", "Riot calls skipped because the request deadline ran out.", ("family",))
+PARTIAL_RESPONSES = REGISTRY.counter("soloq_partial_responses_total", "Player responses served partial at the deadline.")
+FETCH_TIMEOUTS = REGISTRY.counter("soloq_fetch_node_timeouts_total", "Fetch graph nodes that hit their timeout.", ("node",))
+MATCH_STORE_LOOKUPS = REGISTRY.counter("soloq_match_store_lookups_total", "Match lookups served by the match store or Riot.", ("result",))
+REGISTRY.callback("soloq_player_cache_events_total", "PLAYER_CACHE lookups and evictions.",
+                  lambda: {(k,): v for k, v in PLAYER_CACHE.stats().items() if k in PLAYER_CACHE.counters},
+                  ("event",), type="counter")
+REGISTRY.callback("soloq_player_cache_hit_ratio", "Fresh + stale hits over all PLAYER_CACHE lookups.", lambda: PLAYER_CACHE.stats()["hit_ratio"])
+REGISTRY.callback("soloq_player_cache_entries", "Entries in PLAYER_CACHE.", lambda: len(PLAYER_CACHE.entries))
+REGISTRY.callback("soloq_player_cache_bytes", "Serialized size of PLAYER_CACHE.", lambda: PLAYER_CACHE.total_bytes)
+REGISTRY.callback("soloq_executor_queue_depth", "Tasks waiting for a worker in each pool.",
+                  lambda: {("riot",): RIOT_EXECUTOR._work_queue.qsize(), ("player",): PLAYER_EXECUTOR._work_queue.qsize(),
+                           ("season",): SEASON_EXECUTOR._work_queue.qsize()},
+                  ("executor",))
+REGISTRY.callback("soloq_champions_cache_age_seconds", "Age of the DDragon champion list.",
+                  lambda: time.time() - CHAMPIONS_CACHE.state["timestamp"] if CHAMPIONS_CACHE.state["timestamp"] else None)
+
+DEADLINE_ERROR = {"status": 504, "details": "Request deadline exceeded"}
 
-def fetch_data(url, headers, timeout=5, retries=3):
+def fetch_data(url, headers, timeout=5, retries=3, parse=None):
+    """GET a Riot URL. parse(raw_bytes) replaces response.json() when given."""
+    # Si otro hilo ya está pidiendo esta URL, esperamos su respuesta en vez de repetirla
+    try:
+        return UPSTREAM_FLIGHT.do(url, fetch_data_once, url, headers, timeout, retries, parse)
+    except FutureTimeoutError:
+        # Esperando a otra llamada (quizá sin deadline) se nos acabó el nuestro
+        DEADLINE_EXCEEDED.inc(family=endpoint_key(url)[1])
+        return None, dict(DEADLINE_ERROR)
+
+def fetch_data_once(url, headers, timeout=5, retries=3, parse=None):
+    family = endpoint_key(url)[1]
     for i in range(retries + 1):
+        response = None
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
+            left = remaining()
+            if left is not None and left <= 0:
+                DEADLINE_EXCEEDED.inc(family=family)
+                return None, dict(DEADLINE_ERROR)
+
+            # Turno en el limitador compartido antes de salir hacia Riot (sin pasarnos del deadline)
+            wait_start = time.perf_counter()
+            acquired = RIOT_LIMITER.acquire(url, max_wait=bounded(MAX_RATE_LIMIT_WAIT))
+            RATE_LIMIT_WAIT.inc(time.perf_counter() - wait_start, family=family)
+            if not acquired:
+                log(f"[API] Rate limit budget exhausted for {url}. Aborting fetch.")
+                return None, {"status": 429, "details": "Rate limit exceeded. Try again later."}
+
+            with RIOT_SEMAPHORE:
+                with UPSTREAM_SECONDS.time(family=family):
+                    response = HTTP_SESSION.get(url, headers=headers, timeout=bounded(timeout))
+            RIOT_LIMITER.update(url, response.headers)
+            UPSTREAM_REQUESTS.inc(family=family, status=response.status_code)
+
             if response.status_code == 429:
                 retry_after = int(response.headers.get('Retry-After', 1))
-                # Si Riot nos pide esperar más de 10 segundos, abortamos para no colgar Vercel
-                if retry_after > 10:
-                    print(f"[API] Rate limit 429. Wait time {retry_after}s is too long. Aborting fetch.")
+                RIOT_LIMITER.on_rate_limited(url, retry_after, response.headers.get('X-Rate-Limit-Type'))
+                RETRY_AFTER.inc(retry_after, family=family)
+                # Si Riot nos pide esperar más de 10 segundos (o de lo que queda de deadline), abortamos
+                if retry_after > bounded(MAX_RATE_LIMIT_WAIT):
+                    log(f"[API] Rate limit 429. Wait time {retry_after}s is too long. Aborting fetch.")
                     return None, {"status": 429, "details": f"Rate limit exceeded. Try again in {retry_after}s."}
                 
-                print(f"[API] Rate limit 429. Retrying in {retry_after}s...") 
-                time.sleep(retry_after)
+                # La espera la hace el limitador en el siguiente acquire(), para todos los hilos a la vez
+                log(f"[API] Rate limit 429. Retrying in {retry_after}s...") 
+                UPSTREAM_RETRIES.inc(family=family, reason="429")
                 continue
             
             response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
+            return (parse(response.content) if parse else response.json()), None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if response is None:  # Sin respuesta (timeout, conexión): el status ya se contó si la hubo
+                UPSTREAM_REQUESTS.inc(family=family, status="error")
             if i == retries:
                 if "404" not in str(e): # Silenciar logs de 404 para limpieza
-                    print(f"[API] Error fetching {url}: {e}")
+                    log(f"[API] Error fetching {url}: {e}")
                 status_code = 500
                 error_msg = str(e)
                 if hasattr(e, 'response') and e.response is not None:
-                    print(f"[API] Response Status: {e.response.status_code}, Body: {e.response.text}")
+                    log(f"[API] Response Status: {e.response.status_code}, Body: {e.response.text}")
                     status_code = e.response.status_code
                     error_msg = e.response.text
                 return None, {"status": status_code, "details": error_msg}
-            time.sleep(0.5)
+            UPSTREAM_RETRIES.inc(family=family, reason="error")
+            time.sleep(bounded(0.5))
     return None, {"status": 500, "details": "Max retries exceeded"}
 
-def fetch_and_process_match(match_id, headers, puuid):
+def extract_participant_stats(match_id, info, player_stats):
+    """Picks the fields we show in the dashboard from one match-v5 participant."""
+    return {
+        "gameId": match_id,
+        "gameCreation": info.get('gameCreation', 0),
+        "gameDuration": info.get('gameDuration', 0),
+        "win": player_stats.get('win'),
+        "kills": player_stats.get('kills', 0),
+        "deaths": player_stats.get('deaths', 0),
+        "assists": player_stats.get('assists', 0),
+        "championName": player_stats.get('championName', 'Unknown'),
+        "cs": player_stats.get('totalMinionsKilled', 0) + player_stats.get('neutralMinionsKilled', 0),
+        "gold": player_stats.get('goldEarned', 0),
+        "damage": player_stats.get('totalDamageDealtToChampions', 0),
+        "items": [player_stats.get(f'item{i}', 0) for i in range(7)],
+        "teamPosition": player_stats.get('teamPosition', ''),
+        "pentaKills": player_stats.get('pentaKills', 0),
+        "quadraKills": player_stats.get('quadraKills', 0),
+        "tripleKills": player_stats.get('tripleKills', 0)
+    }
+
+def store_match(match_id, data, requester=None):
+    """Extracts every participant of a match-v5 payload into MATCH_STORE and returns {puuid: stats}.
+
+    Other tracked players that played the same game get their cached aggregates updated too.
+    """
+    info = data.get('info', {})
+    participants = {
+        p['puuid']: extract_participant_stats(match_id, info, p)
+        for p in info.get('participants', []) if p.get('puuid')
+    }
+    if participants:
+        MATCH_STORE.put(match_id, participants)
+        feed_tracked_players(match_id, participants, requester)
+    return participants
+
+def feed_tracked_players(match_id, participants, requester=None):
+    """Merges a new match into the cached data of every tracked player in it (duos, five-stacks).
+
+    LP/rank are not in the match, so the entry is marked stale: the next read serves the updated
+    history straight away and revalidates ranked data in the background (match already stored).
+    """
+    for puuid, stats in participants.items():
+        cache_key = TRACKED_PLAYERS.get(puuid)
+        if not cache_key or puuid == requester:
+            continue
+        cached = PLAYER_CACHE.peek(cache_key)
+        if not cached:
+            continue
+        history = cached.get('matches_history') or []
+        if any(m.get('gameId') == match_id for m in history):
+            continue
+        merged = sorted(history + [stats], key=lambda m: m.get('gameCreation', 0), reverse=True)[:10]
+        if stats not in merged:
+            continue  # Más antigua que sus 10 últimas partidas
+        PLAYER_CACHE.mark_stale(cache_key, dict(cached, matches_history=merged, **compute_match_stats(merged)))
+        log(f"[API] Match {match_id} also fed {cache_key}")
+
+def match_url(match_id):
+    return f"{RIOT_REGION_URL}/lol/match/v5/matches/{match_id}"
+
+def process_match(match_id, headers, puuids, hedge=False):
+    """Fetches a match once and returns {puuid: stats} for every requested PUUID that played it.
+
+    hedge=True skips the UPSTREAM_FLIGHT coalescing: it is the duplicate of a straggling fetch.
+    """
+    puuids = set(puuids)
+    # Las partidas terminadas son inmutables: si ya la tenemos no llamamos a Riot
+    known, stats = MATCH_STORE.get_many(match_id, puuids)
+    if known:
+        MATCH_STORE_LOOKUPS.inc(result="hit")
+        return stats
+    MATCH_STORE_LOOKUPS.inc(result="miss")
+
+    # El parseo y el guardado van dentro de la llamada coalescida: se hacen una vez por partida
+    # aunque la pidan a la vez varios jugadores del roster (ver match_parser.py)
+    requester = next(iter(puuids)) if len(puuids) == 1 else None
+    fetch = fetch_data_once if hedge else fetch_data
+    with STAGE_SECONDS.time(stage="match"):
+        participants, _ = fetch(
+            match_url(match_id), headers,
+            parse=lambda raw: store_match(match_id, parse_match(raw), requester)
+        )
+    return {p: s for p, s in (participants or {}).items() if p in puuids}
+
+def fetch_and_process_match(match_id, headers, puuid, hedge=False):
     """Fetches a single match and returns processed stats for the player."""
-    url = f"https://europe.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    data, _ = fetch_data(url, headers)
-    if data:
-        info = data.get('info', {})
-        participants = info.get('participants', [])
-        player_stats = next((p for p in participants if p.get('puuid') == puuid), None)
-        if player_stats:
-            return {
-                "gameId": match_id,
-                "gameCreation": info.get('gameCreation', 0),
-                "gameDuration": info.get('gameDuration', 0),
-                "win": player_stats.get('win'),
-                "kills": player_stats.get('kills', 0),
-                "deaths": player_stats.get('deaths', 0),
-                "assists": player_stats.get('assists', 0),
-                "championName": player_stats.get('championName', 'Unknown'),
-                "cs": player_stats.get('totalMinionsKilled', 0) + player_stats.get('neutralMinionsKilled', 0),
-                "gold": player_stats.get('goldEarned', 0),
-                "damage": player_stats.get('totalDamageDealtToChampions', 0),
-                "items": [player_stats.get(f'item{i}', 0) for i in range(7)],
-                "teamPosition": player_stats.get('teamPosition', ''),
-                "pentaKills": player_stats.get('pentaKills', 0),
-                "quadraKills": player_stats.get('quadraKills', 0),
-                "tripleKills": player_stats.get('tripleKills', 0)
-            }
-    return None
+    return process_match(match_id, headers, [puuid], hedge).get(puuid)
 
 @app.route('/', methods=['GET'])
 @app.route('/api/champions', methods=['GET'])
 def get_champions():
-    global CHAMPIONS_CACHE
-    current_time = time.time()
+    # Sólo se espera a DDragon si no hay lista ni en memoria ni en disco; si no, refresco en segundo plano
+    if not CHAMPIONS_CACHE.ensure_loaded():
+        return jsonify({"error": "Failed to fetch champions"}), 500
+
+    return encoded_response(CHAMPIONS_CACHE.encoded)
+
+def encoded_response(encoded, status=200):
+    """Response from pre-serialized bytes: 304 if the client's ETag matches, else the best encoding."""
+    if status == 200 and encoded.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        encoding, body = encoded.negotiate(request.accept_encodings)
+        response = Response(body, status=status, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(encoded.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'  # Siempre revalidar: el 304 es casi gratis
+    return response
+
+def calculate_score(data):
+    """Same score the dashboard uses to order the leaderboard (tier, division, LP and KDA as tiebreaker)."""
+    score = TIER_VALUES.get((data.get('tier') or 'UNRANKED').upper(), -10) * 1000
+    division = RANK_VALUES.get(str(data.get('rank') or '').upper(), 0)
+    if division > 0:
+        score += (5 - division) * 100
+    score += data.get('lp') or 0
+    if data.get('kda'):
+        score += float(data['kda']) / 100
+    return score
+
+def compute_match_stats(matches_history):
+    """Streak, KDA, top champions and main role from the processed matches (newest first)."""
+    recent_games = []
+    total_kills = 0
+    total_deaths = 0
+    total_assists = 0
+    champ_stats = {}
+
+    for details in matches_history:
+        win = details.get('win')
+        recent_games.append("W" if win else "L")
+
+        total_kills += details.get('kills', 0)
+        total_deaths += details.get('deaths', 0)
+        total_assists += details.get('assists', 0)
+
+        c_name = details.get('championName')
+        if c_name:
+            if c_name not in champ_stats:
+                champ_stats[c_name] = {'wins': 0, 'losses': 0, 'count': 0}
+            champ_stats[c_name]['count'] += 1
+            if win:
+                champ_stats[c_name]['wins'] += 1
+            else:
+                champ_stats[c_name]['losses'] += 1
+
+    # Calculate Main Role
+    main_role = most_played_role(m.get('teamPosition') for m in matches_history)
+
+    # Calculate stats
+    streak = None
+    if recent_games:
+        current_streak_type = recent_games[0]
+        current_streak_count = 0
+        for result in recent_games:
+            if result == current_streak_type:
+                current_streak_count += 1
+            else:
+                break
+        if current_streak_count >= 3:
+            streak = f"{current_streak_count} {'Win' if current_streak_type == 'W' else 'Loss'} Streak"
+
+    kda = None
+    avg_k = None
+    avg_d = None
+    avg_a = None
+    if recent_games:
+        games_count = len(recent_games)
+        avg_k = round(total_kills / games_count, 1)
+        avg_d = round(total_deaths / games_count, 1)
+        avg_a = round(total_assists / games_count, 1)
+        kda = round((total_kills + total_assists) / total_deaths, 2) if total_deaths > 0 else round(total_kills + total_assists, 2)
+
+    top_champs = []
+    sorted_champs = sorted(champ_stats.items(), key=lambda item: item[1]['count'], reverse=True)
+    for champ_name, stats in sorted_champs[:3]:
+        winrate = int((stats['wins'] / stats['count']) * 100)
+        champ = CHAMPIONS_CACHE.lookup(champ_name) or {}
+        top_champs.append({
+            "name": champ_name,
+            "display_name": champ.get("name", champ_name),
+            "key": champ.get("key"),
+            "wins": stats['wins'],
+            "losses": stats['losses'],
+            "winrate": winrate
+        })
+
+    return {
+        "recent_games": recent_games,
+        "kda": kda, "avg_k": avg_k, "avg_d": avg_d, "avg_a": avg_a, "streak": streak,
+        "top_champs": top_champs,
+        "main_role": main_role
+    }
+
+def riot_headers():
+    """Returns (headers, error_body) with the RIOT_API_KEY from the environment."""
+    api_key = os.environ.get('RIOT_API_KEY')
+    if not api_key:
+        log("[API] CRITICAL: RIOT_API_KEY environment variable not found.")
+        return None, {"error": "Server is not configured with a RIOT_API_KEY."}
     
-    # Actualizar caché si está vacía o tiene más de 24 horas
-    if not CHAMPIONS_CACHE["data"] or current_time - CHAMPIONS_CACHE["timestamp"] > 86400:
-        try:
-            print("[API] Fetching champions list from DDragon...")
-            version_resp = requests.get("https://ddragon.leagueoflegends.com/api/versions.json")
-            version_resp.raise_for_status()
-            version = version_resp.json()[0]
-            
-            data_resp = requests.get(f"https://ddragon.leagueoflegends.com/cdn/{version}/data/en_US/champion.json")
-            data_resp.raise_for_status()
-            data = data_resp.json()
-            
-            champions = [champ["name"] for champ in data["data"].values()]
-            CHAMPIONS_CACHE = {"data": champions, "timestamp": current_time}
-            print(f"[API] Champions cached: {len(champions)}")
-        except Exception as e:
-            print(f"[API] Error fetching champions: {e}")
-            return jsonify({"error": "Failed to fetch champions"}), 500
-            
-    return jsonify(CHAMPIONS_CACHE["data"])
+    api_key = api_key.strip() # Eliminar espacios en blanco o saltos de línea
+    log(f"[API] Found RIOT_API_KEY: {api_key[:10]}...")  # Log primeros 10 chars
+    return {"X-Riot-Token": api_key}, None
 
-@app.route('/api/player', methods=['GET'])
-def player():
+def account_url(name, tag):
+    encoded_name = urllib.parse.quote(name)
+    encoded_tag = urllib.parse.quote(tag)
+    return f"{RIOT_REGION_URL}/riot/account/v1/accounts/by-riot-id/{encoded_name}/{encoded_tag}"
+
+def summoner_url(puuid):
+    return f"{RIOT_PLATFORM_URL}/lol/summoner/v4/summoners/by-puuid/{puuid}"
+
+def ranked_url(puuid):
+    return f"{RIOT_PLATFORM_URL}/lol/league/v4/entries/by-puuid/{puuid}"
+
+def match_ids_url(puuid, start=0, count=10, start_time=None):
+    since = f"&startTime={start_time}" if start_time else ""
+    return f"{RIOT_REGION_URL}/lol/match/v5/matches/by-puuid/{puuid}/ids?queue=420&start={start}&count={count}{since}"
+
+def get_cached_player(cache_key):
+    cached = PLAYER_CACHE.get_fresh(cache_key)
+    if cached:
+        log(f"[API] Returning cached data for {cache_key} (Age: {int(PLAYER_CACHE.age(cache_key) or 0)}s)")
+    return cached
+
+def stale_fallback(cached, body, status):
+    """If the refresh failed upstream (429 / 5xx) but we still have old data, serve that instead."""
+    if cached is not None and (status == 429 or status >= 500):
+        PLAYER_CACHE.count_fallback()
+        log(f"[API] Upstream error {status}. Serving expired cached data.")
+        return cached, 200
+    return body, status
+
+def get_incremental_state(puuid, current_time):
+    """Stored state usable for an incremental refresh, or None if a full refresh is due."""
+    if not INCREMENTAL_REFRESH:
+        return None
+    state = MATCH_STORE.get_player_state(puuid)
+    if state and current_time - state['refreshed_at'] < FULL_REFRESH_INTERVAL:
+        return state
+    return None
+
+def delta_match_ids_url(puuid, state):
+    """match-ids URL that only returns games since the newest one we already have."""
+    old_history = state['data'].get('matches_history') or []
+    newest = old_history[0] if old_history else None
+    start_time = newest['gameCreation'] // 1000 if newest and newest.get('gameCreation') else None
+    return match_ids_url(puuid, start_time=start_time)
+
+def new_match_ids(state, delta_ids):
+    """IDs from a delta fetch that are newer than the newest stored game."""
+    old_history = state['data'].get('matches_history') or []
+    newest_id = old_history[0]['gameId'] if old_history else None
+    return list(itertools.takewhile(lambda mid: mid != newest_id, delta_ids))
+
+def build_player_response(game_name, tag, opgg_url, summoner_data, ranked_data, matches_history):
+    level = summoner_data.get('summonerLevel')
+    solo_q_data = next((q for q in ranked_data if q.get('queueType') == 'RANKED_SOLO_5x5'), None)
+
+    # Construir respuesta común
+    response = {
+        "name": game_name,
+        "tag": tag,
+        "level": level,
+        "opgg_url": opgg_url,
+        "matches_history": matches_history,
+        "ddragon_version": CHAMPIONS_CACHE.version,
+        **compute_match_stats(matches_history)
+    }
+
+    if not solo_q_data:
+        # Datos para Unranked
+        response.update({
+            "tier": "UNRANKED",
+            "rank": "",
+            "lp": 0,
+            "wins": 0,
+            "losses": 0
+        })
+    else:
+        # Datos para Ranked
+        response.update({
+            "tier": solo_q_data.get('tier'),
+            "rank": solo_q_data.get('rank'),
+            "lp": solo_q_data.get('leaguePoints', 0),
+            "wins": solo_q_data.get('wins', 0),
+            "losses": solo_q_data.get('losses', 0),
+            "ladder_rank": None, "ranked_flex": None,
+            "past_rank": None, "past_ranks": [],
+            "hot_streak": solo_q_data.get('hotStreak', False),
+            "veteran": solo_q_data.get('veteran', False),
+            "fresh_blood": solo_q_data.get('freshBlood', False),
+            "inactive": solo_q_data.get('inactive', False)
+        })
+    return response
+
+def save_player(cache_key, puuid, response, current_time, full_refresh=True):
+    PLAYER_CACHE.set(cache_key, response)
+    if full_refresh:
+        MATCH_STORE.put_player_state(puuid, response, current_time)
+
+def resolve_account(name, tag, headers):
+    """Returns ((puuid, game_name), None) or (None, (error_body, status)). Memoized in MATCH_STORE."""
+    cache_key = f"{name.lower()}#{tag.lower()}"
+    account = MATCH_STORE.get_account(cache_key, ACCOUNT_TTL)
+    if account:
+        return account, None
+
+    url = account_url(name, tag)
+    log(f"[API] Fetching account: {url}")
+    account_data, error = fetch_data(url, headers, timeout=10)
+    if not account_data:
+        log(f"[API] Error fetching account: {error}")
+        return None, ({"error": "Riot API Error", "details": error['details']}, error['status'])
+
+    puuid = account_data.get('puuid')
+    game_name = account_data.get('gameName', name)
+    MATCH_STORE.put_account(cache_key, puuid, game_name)
+    return (puuid, game_name), None
+
+def player_fetch_graph(name, tag, headers, current_time):
+    """Call graph of one player refresh: account -> delta -> {summoner, league, match_ids} -> matches.
+
+    delta is the incremental check (one match-ids call with startTime, or nothing without stored
+    state). If it finds no new games the graph stops there and the stored state is reused.
+    """
+    def account(results):
+        # El PUUID de un name#tag no cambia: lo recordamos durante ACCOUNT_TTL
+        account, error = resolve_account(name, tag, headers)
+        if account:
+            TRACKED_PLAYERS[account[0]] = f"{name.lower()}#{tag.lower()}"
+        return account, error
+
+    def puuid(results):
+        return results["account"][0][0]
+
+    def delta(results):
+        # Incremental refresh: sólo pedimos los IDs posteriores a la última partida conocida
+        state = get_incremental_state(puuid(results), current_time)
+        if not state:
+            return None
+        delta_ids, _ = fetch_data(delta_match_ids_url(puuid(results), state), headers)
+        if delta_ids is None:
+            return None
+        ids = new_match_ids(state, delta_ids)
+        if ids:
+            log(f"[API] Incremental refresh: {len(ids)} new matches")
+        return {"state": state, "ids": ids}
+
+    def fetch_json(url):
+        # (data, error): un error de Riot no debe confundirse con "sin datos" (p.ej. UNRANKED)
+        return lambda results: fetch_data(url(puuid(results)), headers)
+
+    def match_ids(results):
+        if results["delta"] is not None:
+            return results["delta"]["ids"]
+        return fetch_data(match_ids_url(puuid(results)), headers)[0]
+
+    timed_out_default = (None, ({"error": "Riot API Error", "details": "Account lookup timed out"}, 504))
+    return (
+        FetchGraph(RIOT_EXECUTOR, submit=submit, on_done=observe_fetch_node, on_hedge=lambda name: FETCH_HEDGES.inc(node=name))
+        .add("account", account, timeout=FETCH_NODE_TIMEOUT, default=timed_out_default, stop_if=lambda v: v[1] is not None)
+        .add("delta", delta, deps=("account",), timeout=FETCH_NODE_TIMEOUT,
+             stop_if=lambda v: v is not None and not v["ids"])
+        .add("summoner", fetch_json(summoner_url), deps=("delta",), timeout=FETCH_NODE_TIMEOUT, default=(None, None))
+        .add("league", fetch_json(ranked_url), deps=("delta",), timeout=FETCH_NODE_TIMEOUT, default=(None, None))
+        .add("match_ids", match_ids, deps=("delta",), timeout=FETCH_NODE_TIMEOUT, default=[])
+        # El ritmo real lo marca RIOT_LIMITER, aquí sólo repartimos en el pool compartido
+        .map("matches", lambda mid, results: fetch_and_process_match(mid, headers, puuid(results)),
+             over=lambda results: (results["match_ids"] or [])[:10], deps=("match_ids",), timeout=FETCH_NODE_TIMEOUT,
+             hedge=lambda mid, results: fetch_and_process_match(mid, headers, puuid(results), hedge=True),
+             hedge_after=MATCH_HEDGE_AFTER)
+    )
+
+def previous_player_data(cache_key, puuid, state=None):
+    """Last data served for a player: the cache entry in any state, else the stored incremental state."""
+    previous = PLAYER_CACHE.peek(cache_key)
+    if previous:
+        return previous
+    state = state or MATCH_STORE.get_player_state(puuid)
+    return state['data'] if state else None
+
+def reuse_previous(response, previous, nodes):
+    """Copies ranked data ("league") and level ("summoner") of the previous response for the failed nodes."""
+    # Mejor el rango/nivel de la vez anterior que un UNRANKED falso
+    if previous and "league" in nodes:
+        response.update({k: previous[k] for k in RANKED_FIELDS if k in previous})
+    if previous and "summoner" in nodes:
+        response["level"] = previous.get("level")
+
+def fill_history(response, previous, match_ids=None):
+    """Completes a partial matches_history with the previous games it lacks (all of them if match_ids never arrived).
+
+    Returns True if the response still has fewer games than the previous one.
+    """
+    previous_history = (previous or {}).get('matches_history') or []
+    history = response.get('matches_history') or []
+    have = {m.get('gameId') for m in history}
+    extra = [m for m in previous_history
+             if m.get('gameId') not in have and (match_ids is None or m.get('gameId') in match_ids)]
+    if extra:
+        history = sorted(history + extra, key=lambda m: m.get('gameCreation', 0), reverse=True)[:10]
+        response.update(matches_history=history, **compute_match_stats(history))
+    return len(history) < len(previous_history)
+
+def mark_partial(cache_key, name, tag, response, graph, results, previous):
+    """Completes a response built at the deadline with the previous data and schedules the backfill.
+
+    Caches it as stale, unless it still has fewer games than the previous response: then that one
+    is served instead (stale_fallback) and the partial is not cached. Returns (body, status).
+    """
+    reuse_previous(response, previous, graph.timed_out)
+    # Sin match-ids (o sin el delta del que dependen) no sabemos qué partidas siguen siendo las 10 últimas
+    known_ids = None if graph.timed_out & {"delta", "match_ids"} else results["match_ids"]
+    shorter = fill_history(response, previous, known_ids)
+    response.update({
+        "partial": True,
+        "missing": sorted(graph.timed_out),
+        "missing_matches": graph.missing.get("matches", 0),
+    })
+    PARTIAL_RESPONSES.inc()
+    log(f"[API] Partial response for {name}#{tag}: missing {response['missing']}")
+
+    # Sin guardar el estado incremental: el siguiente refresco completo rellena lo que falta
+    # (las partidas que sí llegaron ya están en MATCH_STORE)
+    if not shorter:
+        PLAYER_CACHE.set(cache_key, response)
+        PLAYER_CACHE.mark_stale(cache_key, response)
+    if PLAYER_CACHE.start_refresh(cache_key):
+        submit(PLAYER_EXECUTOR, backfill_player, cache_key, name, tag)
+    if shorter:
+        log(f"[API] Partial response for {name}#{tag} has fewer games than the previous one. Not caching it.")
+        return stale_fallback(previous, {"error": "Riot API Error", "details": DEADLINE_ERROR['details']}, DEADLINE_ERROR['status'])
+    return response, 200
+
+def backfill_player(cache_key, name, tag):
+    """Completes a partial response in the background, without the request's deadline."""
     try:
-        start_time = time.time()
-        name = request.args.get('name')
-        tag = request.args.get('tag')
+        with no_deadline():
+            run_player_pipeline(name, tag, force=True)
+    finally:
+        PLAYER_CACHE.end_refresh(cache_key)
+
+def observe_fetch_node(name, seconds, timed_out):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if timed_out:
+        FETCH_TIMEOUTS.inc(node=name)
+        log(f"[API] Fetch node {name} timed out after {seconds:.2f}s")
 
-        print(f"[API] Request: name={name}, tag={tag}")
+def get_player_data(name, tag):
+    """Runs the full pipeline for one Riot ID. Returns (body, status) like a Flask view."""
+    if not name or not tag:
+        return {"error": "Missing name or tag"}, 400
 
-        if not name or not tag:
-            return jsonify({"error": "Missing name or tag"}), 400
+    cache_key = f"{name.lower()}#{tag.lower()}"
+    cached, status = PLAYER_CACHE.get(cache_key)
+    if status == FRESH:
+        log(f"[API] Returning cached data for {name}#{tag}")
+        return cached, 200
+    if status == STALE:
+        # Stale-while-revalidate: respondemos ya y refrescamos en segundo plano
+        if PLAYER_CACHE.start_refresh(cache_key):
+            submit(PLAYER_EXECUTOR, refresh_player, cache_key, name, tag)
+        log(f"[API] Returning stale data for {name}#{tag} (refreshing in background)")
+        return cached, 200
+
+    # Varios visitantes pidiendo al mismo jugador a la vez comparten un único pipeline
+    try:
+        body, status = PLAYER_FLIGHT.do(cache_key, run_player_pipeline, name, tag)
+    except FutureTimeoutError:
+        # El pipeline en curso es de otro (scheduler, refresco...) y no acaba dentro de nuestro deadline
+        log(f"[API] Deadline exceeded waiting for the in-flight refresh of {name}#{tag}")
+        body, status = {"error": "Riot API Error", "details": DEADLINE_ERROR['details']}, DEADLINE_ERROR['status']
+    return stale_fallback(cached, body, status)
+
+def refresh_player(cache_key, name, tag):
+    """Background refresh of a stale entry. On failure the stale data simply stays in the cache."""
+    try:
+        with no_deadline():
+            PLAYER_FLIGHT.do(cache_key, run_player_pipeline, name, tag)
+    finally:
+        PLAYER_CACHE.end_refresh(cache_key)
+
+def run_player_pipeline(name, tag, force=False):
+    try:
+        start_time = time.time()
 
         # 0. CHECK CACHE
         cache_key = f"{name.lower()}#{tag.lower()}"
         current_time = time.time()
-        
-        if cache_key in PLAYER_CACHE:
-            cached_entry = PLAYER_CACHE[cache_key]
-            if current_time - cached_entry['timestamp'] < CACHE_DURATION:
-                print(f"[API] Returning cached data for {name}#{tag} (Age: {int(current_time - cached_entry['timestamp'])}s)")
-                return jsonify(cached_entry['data'])
-
-        api_key = os.environ.get('RIOT_API_KEY')
-        if not api_key:
-            print("[API] CRITICAL: RIOT_API_KEY environment variable not found.")
-            return jsonify({"error": "Server is not configured with a RIOT_API_KEY."}), 500
-        
-        api_key = api_key.strip() # Eliminar espacios en blanco o saltos de línea
-        print(f"[API] Found RIOT_API_KEY: {api_key[:10]}...")  # Log primeros 10 chars
-        headers = {"X-Riot-Token": api_key}
-
-        # 1. Get PUUID
-        encoded_name = urllib.parse.quote(name)
-        encoded_tag = urllib.parse.quote(tag)
-        account_url = f"https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{encoded_name}/{encoded_tag}"
-        
-        print(f"[API] Fetching account: {account_url}")
-        account_data, error = fetch_data(account_url, headers, timeout=10)
-        if not account_data:
-            print(f"[API] Error fetching account: {error}")
-            return jsonify({"error": "Riot API Error", "details": error['details']}), error['status']
-            
-        puuid = account_data.get('puuid')
-        game_name = account_data.get('gameName', name)
-        print(f"[API] Step 1 took {time.time() - start_time:.2f}s: PUUID={puuid}")
-
-        step2_start = time.time()
-        # 2. Fetch Summoner, Ranked, and Match IDs in parallel
-        summoner_url = f"https://euw1.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
-        ranked_url = f"https://euw1.api.riotgames.com/lol/league/v4/entries/by-puuid/{puuid}"
-        match_ids_url = f"https://europe.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?queue=420&start=0&count=10"
-
-        def fetch_silent(u, h):
-            d, _ = fetch_data(u, h)
-            return d
-
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_summoner = executor.submit(fetch_silent, summoner_url, headers)
-            future_ranked = executor.submit(fetch_silent, ranked_url, headers)
-            future_match_ids = executor.submit(fetch_silent, match_ids_url, headers)
-
-            summoner_data = future_summoner.result() or {}
-            ranked_data = future_ranked.result() or []
-            match_ids = future_match_ids.result() or []
-
-        print(f"[API] Step 2 took {time.time() - step2_start:.2f}s")
-        level = summoner_data.get('summonerLevel')
-        solo_q_data = next((q for q in ranked_data if q.get('queueType') == 'RANKED_SOLO_5x5'), None)
-
-        # 3. Fetch Matches in parallel
-        step3_start = time.time()
-        recent_games = []
-        total_kills = 0
-        total_deaths = 0
-        total_assists = 0
-        champ_stats = {} 
-        matches_history = []
-
-        if match_ids:
-            # Reducimos workers a 5 para ser más amables con el Rate Limit
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [executor.submit(fetch_and_process_match, mid, headers, puuid) for mid in match_ids[:10]]
-                
-                for i, future in enumerate(futures):
-                    details = future.result()
-                    if details:
-                        matches_history.append(details)
-                        win = details.get('win')
-                        recent_games.append("W" if win else "L")
-                        
-                        k = details.get('kills', 0)
-                        d = details.get('deaths', 0)
-                        a = details.get('assists', 0)
-                        total_kills += k
-                        total_deaths += d
-                        total_assists += a
-                        
-                        c_name = details.get('championName')
-                        if c_name:
-                            if c_name not in champ_stats:
-                                champ_stats[c_name] = {'wins': 0, 'losses': 0, 'count': 0}
-                            champ_stats[c_name]['count'] += 1
-                            if win:
-                                champ_stats[c_name]['wins'] += 1
-                            else:
-                                champ_stats[c_name]['losses'] += 1
-        
-        # Calculate Main Role
-        positions = [m.get('teamPosition') for m in matches_history if m.get('teamPosition')]
-        main_role = max(set(positions), key=positions.count) if positions else "FILL"
-
-        print(f"[API] Step 3 took {time.time() - step3_start:.2f}s")
-
-        # Calculate stats
-        streak = None
-        if recent_games:
-            current_streak_type = recent_games[0]
-            current_streak_count = 0
-            for result in recent_games:
-                if result == current_streak_type:
-                    current_streak_count += 1
-                else:
-                    break
-            if current_streak_count >= 3:
-                streak = f"{current_streak_count} {'Win' if current_streak_type == 'W' else 'Loss'} Streak"
-
-        kda = None
-        avg_k = None
-        avg_d = None
-        avg_a = None
-        if recent_games:
-            games_count = len(recent_games)
-            avg_k = round(total_kills / games_count, 1)
-            avg_d = round(total_deaths / games_count, 1)
-            avg_a = round(total_assists / games_count, 1)
-            kda = round((total_kills + total_assists) / total_deaths, 2) if total_deaths > 0 else round(total_kills + total_assists, 2)
-
-        top_champs = []
-        sorted_champs = sorted(champ_stats.items(), key=lambda item: item[1]['count'], reverse=True)
-        for champ_name, stats in sorted_champs[:3]:
-            winrate = int((stats['wins'] / stats['count']) * 100)
-            top_champs.append({
-                "name": champ_name,
-                "wins": stats['wins'],
-                "losses": stats['losses'],
-                "winrate": winrate
-            })
-
-        # Construir respuesta común
-        response = {
-            "name": game_name,
-            "tag": tag,
-            "level": level,
-            "recent_games": recent_games,
-            "kda": kda, "avg_k": avg_k, "avg_d": avg_d, "avg_a": avg_a, "streak": streak,
-            "top_champs": top_champs,
-            "opgg_url": f"https://www.op.gg/summoners/euw/{urllib.parse.quote(name)}-{tag}",
-            "matches_history": matches_history,
-            "main_role": main_role
-        }
-
-        if not solo_q_data:
-            # Datos para Unranked
-            response.update({
-                "tier": "UNRANKED",
-                "rank": "",
-                "lp": 0,
-                "wins": 0,
-                "losses": 0
-            })
-        else:
-            # Datos para Ranked
-            response.update({
-                "tier": solo_q_data.get('tier'),
-                "rank": solo_q_data.get('rank'),
-                "lp": solo_q_data.get('leaguePoints', 0),
-                "wins": solo_q_data.get('wins', 0),
-                "losses": solo_q_data.get('losses', 0),
-                "ladder_rank": None, "ranked_flex": None,
-                "past_rank": None, "past_ranks": [],
-                "hot_streak": solo_q_data.get('hotStreak', False),
-                "veteran": solo_q_data.get('veteran', False),
-                "fresh_blood": solo_q_data.get('freshBlood', False),
-                "inactive": solo_q_data.get('inactive', False)
-            })
-        
+        cached = None if force else get_cached_player(cache_key)
+        if cached:
+            return cached, 200
+
+        headers, error = riot_headers()
+        if error:
+            return error, 500
+        opgg_url = f"https://www.op.gg/summoners/euw/{urllib.parse.quote(name)}-{tag}"
+
+        # 1..3. Grafo de llamadas: cada paso sale en cuanto tiene lo que necesita (ver fetch_graph.py)
+        graph = player_fetch_graph(name, tag, headers, current_time)
+        results, stopped_at = graph.run()
+        account, error = results["account"]
+        if error:
+            return error
+        puuid, game_name = account
+
+        delta = results["delta"]
+        if stopped_at == "delta":
+            # Nada nuevo desde la última vez: reutilizamos el estado guardado
+            response = dict(delta["state"]['data'], tag=tag, opgg_url=opgg_url)
+            save_player(cache_key, puuid, response, current_time, full_refresh=False)
+            STAGE_SECONDS.observe(time.time() - start_time, stage="pipeline")
+            log(f"[API] No new matches for {name}#{tag}. Total request time: {time.time() - start_time:.2f}s")
+            return response, 200
+
+        summoner_data = results["summoner"][0] or {}
+        ranked_data = results["league"][0] or []
+        # Las partidas nuevas van delante de las que ya teníamos
+        base_history = (delta["state"]['data'].get('matches_history') or []) if delta else []
+        matches_history = ([m for m in results["matches"] if m] + base_history)[:10]
+
+        response = build_player_response(game_name, tag, opgg_url, summoner_data, ranked_data, matches_history)
+
+        # summoner / league con error de Riot (429, 5xx...): nivel y rango de la vez anterior
+        failed_nodes = [node for node in ("summoner", "league") if results[node][1]]
+        previous = previous_player_data(cache_key, puuid, delta and delta["state"]) if failed_nodes or graph.timed_out else None
+        if failed_nodes:
+            if "league" in failed_nodes and not previous:
+                error = results["league"][1]
+                return {"error": "Riot API Error", "details": error['details']}, error['status']
+            if previous:
+                reuse_previous(response, previous, failed_nodes)
+                PLAYER_CACHE.count_fallback()
+            log(f"[API] {', '.join(failed_nodes)} failed for {name}#{tag}. Not saving incremental state.")
+
+        if graph.timed_out:
+            # Se acabó el tiempo (deadline o timeout de algún nodo): respondemos con lo que ha llegado
+            body, status = mark_partial(cache_key, name, tag, response, graph, results, previous)
+            STAGE_SECONDS.observe(time.time() - start_time, stage="pipeline")
+            return body, status
+
         # SAVE TO CACHE
-        PLAYER_CACHE[cache_key] = {
-            'data': response,
-            'timestamp': current_time
-        }
+        # Si alguna partida no llegó no guardamos el estado incremental: el siguiente refresco vuelve
+        # a pedir desde la última partida guardada y rellena el hueco (las que sí llegaron ya están en MATCH_STORE)
+        failed_matches = results["matches"].count(None)
+        if failed_matches:
+            log(f"[API] {failed_matches} matches failed for {name}#{tag}. Not saving incremental state.")
+        save_player(cache_key, puuid, response, current_time, full_refresh=not failed_matches and not failed_nodes)
+        if failed_nodes:
+            PLAYER_CACHE.mark_stale(cache_key, response)  # El rango reutilizado se revalida en la siguiente lectura
         
-        print(f"[API] Total request time: {time.time() - start_time:.2f}s")
-        return jsonify(response)
+        STAGE_SECONDS.observe(time.time() - start_time, stage="pipeline")
+        log(f"[API] Total request time: {time.time() - start_time:.2f}s")
+        return response, 200
+
+    except Exception as err:
+        import traceback
+        log(f"[API] An unexpected error occurred: {err}")
+        traceback.print_exc()
+        return {"error": "Internal server error", "details": str(err)}, 500
+
+def fetch_season_match_ids(puuid, headers):
+    """Pages through match-ids (100 per call) for every ranked game since SEASON_START."""
+    match_ids = []
+    while len(match_ids) < DEEP_HISTORY_MAX_GAMES:
+        page, _ = fetch_data(match_ids_url(puuid, start=len(match_ids), count=100, start_time=SEASON_START), headers)
+        if not page:
+            break
+        match_ids.extend(page)
+        if len(page) < 100:
+            break
+    return match_ids[:DEEP_HISTORY_MAX_GAMES]
+
+def fetch_season_match(match_id, headers, puuid):
+    """fetch_and_process_match() that only calls Riot within the season's share of the app budget."""
+    known, stats = MATCH_STORE.get_many(match_id, {puuid})
+    if known:
+        MATCH_STORE_LOOKUPS.inc(result="hit")
+        return stats.get(puuid)
+    # Sin esperar: si la parte de la temporada está gastada la partida queda para la próxima vez
+    if not SEASON_LIMITER.acquire(match_url(match_id), max_wait=0):
+        return None
+    return fetch_and_process_match(match_id, headers, puuid)
+
+def run_season_pipeline(name, tag):
+    try:
+        start_time = time.time()
+        cache_key = f"season:{name.lower()}#{tag.lower()}"
+        cached = PLAYER_CACHE.get_fresh(cache_key)
+        if cached:
+            return cached, 200
+
+        headers, error = riot_headers()
+        if error:
+            return error, 500
+        account, error = resolve_account(name, tag, headers)
+        if error:
+            return error
+        puuid, _ = account
+
+        match_ids = fetch_season_match_ids(puuid, headers)
+        log(f"[API] Season history for {name}#{tag}: {len(match_ids)} games")
+
+        # Las partidas ya guardadas en MATCH_STORE no cuestan ninguna llamada
+        futures = [submit(SEASON_EXECUTOR, fetch_season_match, mid, headers, puuid) for mid in match_ids]
+        history = MatchHistory()
+        for future in futures:
+            details = future.result()
+            if details:
+                history.append(details)
+
+        season = history.summary()
+        season["requested_games"] = len(match_ids)
+        if len(history) < len(match_ids):
+            # Faltan partidas (presupuesto de temporada gastado, errores de Riot...): sin cachear, la
+            # siguiente petición pide sólo las que faltan (las demás ya están en MATCH_STORE)
+            season.update({"partial": True, "missing_matches": len(match_ids) - len(history)})
+            log(f"[API] Season history for {name}#{tag} is partial: {season['missing_matches']} games missing")
+        else:
+            PLAYER_CACHE.set(cache_key, season)
+        STAGE_SECONDS.observe(time.time() - start_time, stage="season")
+        log(f"[API] Season history took {time.time() - start_time:.2f}s")
+        return season, 200
 
     except Exception as err:
         import traceback
-        print(f"[API] An unexpected error occurred: {err}")
+        log(f"[API] An unexpected error occurred: {err}")
         traceback.print_exc()
-        return jsonify({"error": "Internal server error", "details": str(err)}), 500
+        return {"error": "Internal server error", "details": str(err)}, 500
+
+def get_season_data(name, tag):
+    """Regular player data plus a "season" block computed from the whole ranked season."""
+    body, status = get_player_data(name, tag)
+    if status != 200:
+        return body, status
+
+    # El historial de temporada va sin deadline en segundo plano; si no llega a tiempo respondemos
+    # sin él (partial) y queda cacheado para la siguiente petición
+    future = submit(SEASON_PIPELINE_EXECUTOR, run_season_in_background, name, tag)
+    left = remaining()
+    try:
+        season, season_status = future.result(timeout=None if left is None else max(0, left))
+    except FutureTimeoutError:
+        return dict(body, season=None, partial=True), 200
+    if season_status != 200:
+        return body, status
+    return dict(body, season=season), 200
+
+def run_season_in_background(name, tag):
+    with no_deadline():
+        return PLAYER_FLIGHT.do(f"season:{name.lower()}#{tag.lower()}", run_season_pipeline, name, tag)
+
+def submit_player(name, tag):
+    """Starts the player pipeline on the configured engine and returns a concurrent.futures.Future."""
+    if PIPELINE_ENGINE == 'async':
+        from async_pipeline import submit_player_data
+        return submit_player_data(name, tag)
+    return submit(PLAYER_EXECUTOR, get_player_data, name, tag)
+
+def run_pipeline(entries):
+    """Runs the player pipeline for [(name, tag), ...] on the configured engine. Returns [(body, status), ...]."""
+    if PIPELINE_ENGINE != 'async' and len(entries) == 1:
+        return [get_player_data(*entries[0])]
+    futures = [submit_player(name, tag) for name, tag in entries]
+    return [future.result() for future in futures]
+
+def parse_roster(payload):
+    """Returns ([(name, tag), ...], error_message) from a /api/players style body."""
+    roster = payload.get('players') if isinstance(payload, dict) else payload
+    if not isinstance(roster, list) or not roster:
+        return None, "Missing players list"
+    if len(roster) > BATCH_MAX_PLAYERS:
+        return None, f"Too many players (max {BATCH_MAX_PLAYERS})"
+
+    # Acepta tanto {name, tag} como el formato del frontend {summonerName, tag}
+    entries = []
+    for i, p in enumerate(roster):
+        p = p if isinstance(p, dict) else {}
+        name, tag = p.get('name') or p.get('summonerName'), p.get('tag')
+        # Vacíos se quedan en un error por jugador; de otro tipo rechazan la petición entera
+        if not all(v is None or isinstance(v, str) for v in (name, tag)):
+            return None, f"Invalid player at index {i}: name and tag must be strings"
+        entries.append((name, tag))
+    return entries, None
+
+def player_result(name, tag, body, status):
+    """Body for one roster entry: the player data, or an error placeholder that still renders."""
+    if status == 200:
+        return body
+    # Marcamos el error por jugador sin tumbar el resto del ranking
+    return {
+        "name": name, "tag": tag, "tier": "UNRANKED", "rank": "", "lp": 0,
+        "wins": 0, "losses": 0, "error": True, "status": status,
+        "details": body.get('details') or body.get('error')
+    }
+
+@app.route('/api/cron/refresh', methods=['GET'])
+def cron_refresh():
+    """Vercel Cron entry point: one scheduler pass over the roster (see scheduler.py)."""
+    # Sin CRON_SECRET el endpoint queda cerrado: cualquiera podría forzar refrescos sin caché
+    secret = os.environ.get('CRON_SECRET')
+    if not secret or request.headers.get('Authorization') != f"Bearer {secret}":
+        return jsonify({"error": "Unauthorized"}), 401
+
+    max_players = request.args.get('max', str(CRON_MAX_PLAYERS))
+    if not max_players.isdigit():
+        return jsonify({"error": "max must be a non-negative integer"}), 400
+
+    from scheduler import run_once
+    # Sin espaciar: en serverless tenemos poco tiempo, el ritmo lo marca RIOT_LIMITER
+    refreshed = run_once(max_players=int(max_players), spacing=0)
+    return jsonify({"refreshed": refreshed})
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    if TRACE_LOGS:
+        g.trace_token = TRACE_ID.set(new_trace_id(request.headers.get('X-Request-ID')))
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if TRACE_LOGS:
+        response.headers['X-Trace-Id'] = TRACE_ID.get()
+    return response
+
+@app.teardown_request
+def end_request_trace(_error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        TRACE_ID.reset(token)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this instance's metrics (see metrics.py)."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(PLAYER_CACHE.stats())
+
+@app.route('/api/player', methods=['GET'])
+def player():
+    name = request.args.get('name')
+    tag = request.args.get('tag')
+    log(f"[API] Request: name={name}, tag={tag}")
+
+    # ?history=season añade el historial de toda la temporada (más lento en frío)
+    with request_deadline(REQUEST_DEADLINE):
+        if request.args.get('history') == 'season':
+            body, status = get_season_data(name, tag)
+        else:
+            body, status = run_pipeline([(name, tag)])[0]
+    if status != 200:
+        return jsonify(body), status
+    # Un hit de caché reutiliza los bytes ya serializados (y comprimidos) de la entrada
+    return encoded_response(PLAYER_CACHE.encoded(f"{name.lower()}#{tag.lower()}", body))
+
+@app.route('/api/players', methods=['POST'])
+def players():
+    """Batch leaderboard: runs the player pipeline for the whole roster in one call.
+
+    Body: {"players": [{"name": ..., "tag": ...}, ...], "sort": "score"} (or just the list).
+    """
+    start_time = time.time()
+    payload = request.get_json(silent=True)
+    sort = (payload.get('sort') if isinstance(payload, dict) else None) or request.args.get('sort')
+
+    entries, error = parse_roster(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    log(f"[API] Batch request: {len(entries)} players")
+
+    with request_deadline(REQUEST_DEADLINE):
+        bodies = run_pipeline(entries)
+    results = [
+        (player_result(name, tag, body, status), f"{name.lower()}#{tag.lower()}" if status == 200 else None)
+        for (name, tag), (body, status) in zip(entries, bodies)
+    ]
+
+    if sort == 'score':
+        results.sort(key=lambda result: calculate_score(result[0]), reverse=True)
+
+    # La lista se monta pegando los bytes ya serializados de cada jugador en caché
+    body = b"[" + b",".join(
+        PLAYER_CACHE.encoded(cache_key, result).body if cache_key else dumps(result)
+        for result, cache_key in results
+    ) + b"]"
+    log(f"[API] Batch request time: {time.time() - start_time:.2f}s")
+    return encoded_response(EncodedBody(body))
+
+def stream_event(event_type, payload, sse):
+    data = json.dumps({"type": event_type, **payload})
+    return f"event: {event_type}\ndata: {data}\n\n" if sse else data + "\n"
+
+@app.route('/api/players/stream', methods=['GET', 'POST'])
+def players_stream():
+    """Progressive leaderboard: one event per player as soon as it is ready, cached players first.
+
+    POST takes the same body as /api/players; GET streams the default roster (roster.json).
+    NDJSON by default, Server-Sent Events with ?format=sse or Accept: text/event-stream.
+      {"type": "player", "index": i, "data": {...}}   one per roster entry, in completion order
+      {"type": "done", "order": [i, ...]}             roster indexes sorted by score
+    """
+    if request.method == 'POST':
+        entries, error = parse_roster(request.get_json(silent=True))
+        if error:
+            return jsonify({"error": error}), 400
+    else:
+        from scheduler import load_roster
+        entries = load_roster()
+
+    sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    log(f"[API] Stream request: {len(entries)} players ({'sse' if sse else 'ndjson'})")
+
+    # Los que no están en caché se lanzan ya; los cacheados se emiten mientras tanto
+    cached, pending = [], {}
+    with request_deadline(REQUEST_DEADLINE):  # Las tareas lanzadas aquí heredan el deadline
+        for i, (name, tag) in enumerate(entries):
+            if name and tag and PLAYER_CACHE.status(f"{name.lower()}#{tag.lower()}") in (FRESH, STALE):
+                cached.append(i)
+            else:
+                pending[submit_player(name, tag)] = i
+
+    def generate():
+        start_time = time.time()
+        results = {}
+
+        def emit(i, body, status):
+            name, tag = entries[i]
+            results[i] = player_result(name, tag, body, status)
+            return stream_event("player", {"index": i, "data": results[i]}, sse)
+
+        for i in cached:
+            yield emit(i, *get_player_data(*entries[i]))
+        for future in as_completed(pending):
+            yield emit(pending[future], *future.result())
+
+        order = sorted(results, key=lambda i: calculate_score(results[i]), reverse=True)
+        yield stream_event("done", {"order": order}, sse)
+        log(f"[API] Stream request time: {time.time() - start_time:.2f}s")
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Scheduler opcional dentro de la app para mantener el roster siempre en caché
+if os.environ.get('ROSTER_SCHEDULER') == '1':
+    from scheduler import start_scheduler
+    start_scheduler()
 
 # IMPORTANTE: Para Vercel, NO uses app.run()
 # La app Flask se exporta automáticamente
\ No newline at end of file
@@ -0,0 +1,338 @@
+"""Asyncio version of the player pipeline (fetch_data / fetch_and_process_match / get_player_data).
+
+Same caches, match store and rate limiter as app.py, but every upstream call is a coroutine on
+one event loop with aiohttp, so hundreds of in-flight Riot calls cost no threads and the
+rate-limit backoff is an asyncio.sleep instead of a blocked worker. The request deadline of the
+calling Flask view (deadline.py) bounds every wait and call here too.
+
+It does not run the fetch graph of the threads engine (fetch_graph.py), so compared with it:
+  - no per-node timeouts (FETCH_NODE_TIMEOUT): only the request deadline bounds a call;
+  - no hedged match fetches (MATCH_HEDGE_AFTER);
+  - a response is "partial" only when the deadline ran out with data missing, and it is completed
+    by the stale-while-revalidate refresh of the next read instead of a backfill started at once.
+
+Flask uses it through submit_player_data() when PIPELINE_ENGINE=async.
+For batch jobs it can be run on its own:
+
+    python async_pipeline.py "Sapo Vazquez#C4NC3" "CriticalBilbo#SVQ"
+    python async_pipeline.py --roster roster.json --sort score
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import urllib.parse
+
+import aiohttp
+
+from match_parser import parse_match
+
+from app import (
+    MATCH_STORE, TRACKED_PLAYERS, RIOT_LIMITER, MAX_RATE_LIMIT_WAIT, ACCOUNT_TTL, PLAYER_FLIGHT, UPSTREAM_FLIGHT,
+    match_url, store_match, riot_headers, account_url, summoner_url, ranked_url, match_ids_url,
+    PLAYER_CACHE, FRESH, STALE, get_cached_player, stale_fallback, get_incremental_state, delta_match_ids_url, new_match_ids,
+    build_player_response, save_player, calculate_score, previous_player_data, reuse_previous, fill_history, DEADLINE_ERROR,
+    DEADLINE_EXCEEDED, PARTIAL_RESPONSES, STAGE_SECONDS, UPSTREAM_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_RETRIES, RATE_LIMIT_WAIT, RETRY_AFTER, MATCH_STORE_LOOKUPS,
+)
+from rate_limiter import endpoint_key
+from metrics import log
+from deadline import remaining, bounded, no_deadline
+
+ASYNC_MAX_CONCURRENCY = 100  # Conexiones simultáneas del cliente aiohttp (las limita RIOT_LIMITER de verdad)
+
+# Event loop de vida de proceso para que Flask (síncrono) pueda usar el motor async
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_SESSION = None
+_BACKGROUND_TASKS = set()  # Referencias a los refrescos en segundo plano para que no los recoja el GC
+
+def new_session():
+    connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONCURRENCY, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector)
+
+def get_loop():
+    """Starts (once) a background thread running the event loop shared by all Flask requests."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="async-pipeline", daemon=True).start()
+    return _LOOP
+
+async def get_session():
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = new_session()
+    return _SESSION
+
+async def fetch_data_async(session, url, headers, timeout=5, retries=3, parse=None):
+    try:
+        return await UPSTREAM_FLIGHT.do_async(url, fetch_data_once_async, session, url, headers, timeout, retries, parse)
+    except asyncio.TimeoutError:
+        DEADLINE_EXCEEDED.inc(family=endpoint_key(url)[1])
+        return None, dict(DEADLINE_ERROR)
+
+async def fetch_data_once_async(session, url, headers, timeout=5, retries=3, parse=None):
+    family = endpoint_key(url)[1]
+    for i in range(retries + 1):
+        try:
+            left = remaining()
+            if left is not None and left <= 0:
+                DEADLINE_EXCEEDED.inc(family=family)
+                return None, dict(DEADLINE_ERROR)
+
+            # Turno en el limitador compartido: esperamos sin bloquear ningún hilo (ni pasarnos del deadline)
+            waited = 0
+            wait = RIOT_LIMITER.try_acquire(url)
+            while wait > 0:
+                if waited + wait > bounded(MAX_RATE_LIMIT_WAIT):
+                    log(f"[API] Rate limit budget exhausted for {url}. Aborting fetch.")
+                    return None, {"status": 429, "details": "Rate limit exceeded. Try again later."}
+                await asyncio.sleep(wait)
+                waited += wait
+                wait = RIOT_LIMITER.try_acquire(url)
+            if waited:
+                RATE_LIMIT_WAIT.inc(waited, family=family)
+
+            request_start = time.perf_counter()
+
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=bounded(timeout))) as response:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - request_start, family=family)
+                UPSTREAM_REQUESTS.inc(family=family, status=response.status)
+                RIOT_LIMITER.update(url, response.headers)
+
+                if response.status == 429:
+                    retry_after = int(response.headers.get('Retry-After', 1))
+                    RIOT_LIMITER.on_rate_limited(url, retry_after, response.headers.get('X-Rate-Limit-Type'))
+                    RETRY_AFTER.inc(retry_after, family=family)
+                    # Si Riot nos pide esperar más de 10 segundos (o de lo que queda de deadline), abortamos
+                    if retry_after > bounded(MAX_RATE_LIMIT_WAIT):
+                        log(f"[API] Rate limit 429. Wait time {retry_after}s is too long. Aborting fetch.")
+                        return None, {"status": 429, "details": f"Rate limit exceeded. Try again in {retry_after}s."}
+
+                    log(f"[API] Rate limit 429. Retrying in {retry_after}s...")
+                    UPSTREAM_RETRIES.inc(family=family, reason="429")
+                    continue
+
+                if response.status >= 400:
+                    if i == retries:
+                        body = await response.text()
+                        if response.status != 404: # Silenciar logs de 404 para limpieza
+                            log(f"[API] Error fetching {url}: {response.status}")
+                            log(f"[API] Response Status: {response.status}, Body: {body}")
+                        return None, {"status": response.status, "details": body}
+                else:
+                    if parse:
+                        return parse(await response.read()), None
+                    return await response.json(content_type=None), None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            UPSTREAM_REQUESTS.inc(family=family, status="error")
+            if i == retries:
+                log(f"[API] Error fetching {url}: {e!r}")
+                return None, {"status": 500, "details": str(e) or repr(e)}
+        UPSTREAM_RETRIES.inc(family=family, reason="error")
+        await asyncio.sleep(bounded(0.5))
+    return None, {"status": 500, "details": "Max retries exceeded"}
+
+async def process_match_async(session, match_id, headers, puuids):
+    """Fetches a match once and returns {puuid: stats} for every requested PUUID that played it."""
+    puuids = set(puuids)
+    known, stats = MATCH_STORE.get_many(match_id, puuids)
+    if known:
+        MATCH_STORE_LOOKUPS.inc(result="hit")
+        return stats
+    MATCH_STORE_LOOKUPS.inc(result="miss")
+
+    requester = next(iter(puuids)) if len(puuids) == 1 else None
+    with STAGE_SECONDS.time(stage="match"):
+        participants, _ = await fetch_data_async(
+            session, match_url(match_id), headers,
+            parse=lambda raw: store_match(match_id, parse_match(raw), requester)
+        )
+    return {p: s for p, s in (participants or {}).items() if p in puuids}
+
+async def fetch_and_process_match_async(session, match_id, headers, puuid):
+    """Fetches a single match and returns processed stats for the player."""
+    return (await process_match_async(session, match_id, headers, [puuid])).get(puuid)
+
+async def get_player_data_async(name, tag, session=None):
+    """Async get_player_data(). Returns (body, status) like a Flask view."""
+    if not name or not tag:
+        return {"error": "Missing name or tag"}, 400
+
+    cache_key = f"{name.lower()}#{tag.lower()}"
+    cached, status = PLAYER_CACHE.get(cache_key)
+    if status == FRESH:
+        return cached, 200
+    if status == STALE:
+        # Stale-while-revalidate: respondemos ya y refrescamos en segundo plano
+        if PLAYER_CACHE.start_refresh(cache_key):
+            task = asyncio.ensure_future(refresh_player_async(cache_key, name, tag))
+            _BACKGROUND_TASKS.add(task)
+            task.add_done_callback(_BACKGROUND_TASKS.discard)
+        return cached, 200
+
+    try:
+        body, status = await PLAYER_FLIGHT.do_async(cache_key, run_player_pipeline_async, name, tag, session)
+    except asyncio.TimeoutError:
+        log(f"[API] Deadline exceeded waiting for the in-flight refresh of {name}#{tag}")
+        body, status = {"error": "Riot API Error", "details": DEADLINE_ERROR['details']}, DEADLINE_ERROR['status']
+    return stale_fallback(cached, body, status)
+
+async def refresh_player_async(cache_key, name, tag):
+    try:
+        with no_deadline():
+            await PLAYER_FLIGHT.do_async(cache_key, run_player_pipeline_async, name, tag)
+    finally:
+        PLAYER_CACHE.end_refresh(cache_key)
+
+async def run_player_pipeline_async(name, tag, session=None):
+    try:
+        start_time = time.time()
+        session = session or await get_session()
+
+        # 0. CHECK CACHE
+        cache_key = f"{name.lower()}#{tag.lower()}"
+        current_time = time.time()
+        cached = get_cached_player(cache_key)
+        if cached:
+            return cached, 200
+
+        headers, error = riot_headers()
+        if error:
+            return error, 500
+        opgg_url = f"https://www.op.gg/summoners/euw/{urllib.parse.quote(name)}-{tag}"
+
+        # 1. Get PUUID
+        account = MATCH_STORE.get_account(cache_key, ACCOUNT_TTL)
+        if account:
+            puuid, game_name = account
+        else:
+            account_data, error = await fetch_data_async(session, account_url(name, tag), headers, timeout=10)
+            if not account_data:
+                log(f"[API] Error fetching account: {error}")
+                return {"error": "Riot API Error", "details": error['details']}, error['status']
+
+            puuid = account_data.get('puuid')
+            game_name = account_data.get('gameName', name)
+            MATCH_STORE.put_account(cache_key, puuid, game_name)
+        TRACKED_PLAYERS[puuid] = cache_key
+
+        # 1b. Incremental refresh
+        match_ids = None
+        base_history = []
+        state = get_incremental_state(puuid, current_time)
+        if state:
+            delta_ids, _ = await fetch_data_async(session, delta_match_ids_url(puuid, state), headers)
+            if delta_ids is not None:
+                match_ids = new_match_ids(state, delta_ids)
+                if not match_ids:
+                    response = dict(state['data'], tag=tag, opgg_url=opgg_url)
+                    save_player(cache_key, puuid, response, current_time, full_refresh=False)
+                    return response, 200
+                base_history = state['data'].get('matches_history') or []
+
+        # 2. Summoner, Ranked and Match IDs concurrently
+        urls = [summoner_url(puuid), ranked_url(puuid)] + ([match_ids_url(puuid)] if match_ids is None else [])
+        results = await asyncio.gather(*(fetch_data_async(session, u, headers) for u in urls))
+        summoner_data = results[0][0] or {}
+        ranked_data = results[1][0] or []
+        ids_missing = match_ids is None and results[2][0] is None
+        if match_ids is None:
+            match_ids = results[2][0] or []
+
+        # 3. Matches concurrently
+        details = await asyncio.gather(*(
+            fetch_and_process_match_async(session, mid, headers, puuid) for mid in match_ids[:10]
+        ))
+        matches_history = ([d for d in details if d] + base_history)[:10]
+
+        response = build_player_response(game_name, tag, opgg_url, summoner_data, ranked_data, matches_history)
+
+        # summoner / league con error de Riot: nivel y rango de la vez anterior (ver run_player_pipeline)
+        failed_nodes = [node for node, (_, error) in zip(("summoner", "league"), results) if error]
+        previous = previous_player_data(cache_key, puuid, state) if failed_nodes or ids_missing else None
+        if failed_nodes:
+            if "league" in failed_nodes and not previous:
+                error = results[1][1]
+                return {"error": "Riot API Error", "details": error['details']}, error['status']
+            if previous:
+                reuse_previous(response, previous, failed_nodes)
+                PLAYER_CACHE.count_fallback()
+            log(f"[API] {', '.join(failed_nodes)} failed for {name}#{tag}. Not saving incremental state.")
+
+        # Con alguna partida fallida no guardamos el estado incremental (ver run_player_pipeline)
+        failed_matches = details.count(None)
+        if failed_matches:
+            log(f"[API] {failed_matches} matches failed for {name}#{tag}. Not saving incremental state.")
+
+        left = remaining()
+        if left is not None and left <= 0 and (failed_nodes or failed_matches or ids_missing):
+            # Se acabó el deadline: lo que falta lo completa el refresco en segundo plano de la
+            # siguiente lectura, que ve la entrada stale (stale-while-revalidate)
+            previous = previous or previous_player_data(cache_key, puuid, state)
+            shorter = fill_history(response, previous, None if ids_missing else match_ids[:10])
+            response.update({
+                "partial": True,
+                "missing": failed_nodes + (["match_ids"] if ids_missing else []) + (["matches"] if failed_matches else []),
+                "missing_matches": failed_matches,
+            })
+            PARTIAL_RESPONSES.inc()
+            log(f"[API] Partial response for {name}#{tag}: missing {response['missing']}")
+            if shorter:
+                # Con menos partidas que la respuesta anterior no la pisamos en la caché (ver mark_partial)
+                log(f"[API] Partial response for {name}#{tag} has fewer games than the previous one. Not caching it.")
+                return stale_fallback(previous, {"error": "Riot API Error", "details": DEADLINE_ERROR['details']}, DEADLINE_ERROR['status'])
+        save_player(cache_key, puuid, response, current_time,
+                    full_refresh=not failed_matches and not failed_nodes and not ids_missing)
+        if failed_nodes or response.get("partial"):
+            PLAYER_CACHE.mark_stale(cache_key, response)
+
+        STAGE_SECONDS.observe(time.time() - start_time, stage="pipeline")
+        log(f"[API] Async pipeline for {name}#{tag} took {time.time() - start_time:.2f}s")
+        return response, 200
+
+    except Exception as err:
+        import traceback
+        log(f"[API] An unexpected error occurred: {err}")
+        traceback.print_exc()
+        return {"error": "Internal server error", "details": str(err)}, 500
+
+async def get_players_data_async(entries, session=None):
+    """Runs the async pipeline for a list of (name, tag) at once. Returns [(body, status), ...]."""
+    return await asyncio.gather(*(get_player_data_async(name, tag, session) for name, tag in entries))
+
+def submit_player_data(name, tag):
+    """Schedules get_player_data_async on the shared loop and returns a concurrent.futures.Future."""
+    # La tarea se crea con una copia del contexto de quien llama, así hereda su deadline
+    return asyncio.run_coroutine_threadsafe(get_player_data_async(name, tag), get_loop())
+
+async def _main(entries, sort):
+    async with new_session() as session:
+        results = await get_players_data_async(entries, session)
+    bodies = [body for body, _ in results]
+    if sort == 'score':
+        bodies.sort(key=calculate_score, reverse=True)
+    return bodies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch SoloQ data for a roster with the async pipeline.")
+    parser.add_argument('players', nargs='*', help='Riot IDs as name#tag')
+    parser.add_argument('--roster', help='JSON file with [{"name": ..., "tag": ...}, ...]')
+    parser.add_argument('--sort', choices=['score'], help='Sort the output by leaderboard score')
+    args = parser.parse_args(argv)
+
+    entries = [tuple(p.rsplit('#', 1)) for p in args.players if '#' in p]
+    if args.roster:
+        with open(args.roster) as f:
+            entries += [(p.get('name') or p.get('summonerName'), p.get('tag')) for p in json.load(f)]
+    if not entries:
+        parser.error("No players given")
+
+    json.dump(asyncio.run(_main(entries, args.sort)), sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+if __name__ == '__main__':
+    main()
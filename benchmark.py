@@ -0,0 +1,220 @@
+"""Benchmark of the player endpoints against a local fake Riot API (fake_riot.py).
+
+Starts fake_riot.py in a subprocess, points the app at it (RIOT_REGION_URL / RIOT_PLATFORM_URL)
+with an empty match store, and drives the Flask app at the given concurrency in phases:
+
+  cold     every roster player once, nothing cached (full pipeline)
+  warm     --requests random players, all cached
+  expired  every roster player once after aging the whole cache past STALE_CACHE_DURATION
+           (incremental refresh against the stored state)
+
+For each phase it reports p50/p95/p99 latency, throughput, upstream calls per endpoint family
+and status, players served partial at the deadline, and the process peak RSS. --json saves the
+report; --baseline compares against a saved one and exits with status 1 if p95, throughput or
+upstream calls regress more than --tolerance.
+
+    python benchmark.py --roster-size 50 --concurrency 10 --requests 500
+    python benchmark.py --endpoint players --latency lognormal:120:0.6 --error-rate 0.02
+    python benchmark.py --json bench.json && python benchmark.py --baseline bench.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+import subprocess
+import statistics
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_riot
+
+PHASES = ("cold", "warm", "expired")
+
+def start_fake_riot(port, fake_args):
+    """fake_riot.py in a subprocess (its threads and payloads don't count in our memory)."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_riot.py')
+    process = subprocess.Popen([sys.executable, script, '--port', str(port), *fake_args], stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            upstream_stats(port)
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("fake_riot.py did not start")
+
+def upstream_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats", timeout=2) as response:
+        return json.load(response)
+
+def upstream_delta(before, after):
+    def diff(key):
+        return {k: v - before[key].get(k, 0) for k, v in after[key].items() if v - before[key].get(k, 0)}
+    return {"calls": after["calls"] - before["calls"], "by_family": diff("by_family"),
+            "by_status": diff("by_status"), "bytes": after["bytes_sent"] - before["bytes_sent"]}
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB en Linux
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def make_jobs(phase, roster, endpoint, requests_count, batch_size, rng):
+    """Each job is the list of players of one HTTP request."""
+    if phase == "warm":
+        if endpoint == "players":
+            return [rng.sample(roster, min(batch_size, len(roster))) for _ in range(requests_count)]
+        return [[rng.choice(roster)] for _ in range(requests_count)]
+    players = list(roster)
+    rng.shuffle(players)
+    size = batch_size if endpoint == "players" else 1
+    return [players[i:i + size] for i in range(0, len(players), size)]
+
+def run_phase(app_module, jobs, endpoint, concurrency):
+    local = threading.local()
+
+    def call(job):
+        client = getattr(local, 'client', None) or app_module.app.test_client()
+        local.client = client
+        start = time.perf_counter()
+        if endpoint == "players":
+            response = client.post('/api/players', json={"players": [{"name": n, "tag": t} for n, t in job]})
+        else:
+            name, tag = job[0]
+            response = client.get('/api/player', query_string={"name": name, "tag": tag})
+        latency = time.perf_counter() - start
+        body = response.get_json(silent=True)
+        players = body if isinstance(body, list) else [body or {}]
+        response.close()
+        return latency, response.status_code, sum(1 for p in players if p.get("partial"))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, jobs))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _, _ in results)
+    return {
+        "requests": len(results),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1),
+        "statuses": dict(Counter(str(status) for _, status, _ in results)),
+        "partial_players": sum(partial for _, _, partial in results),
+    }
+
+def expire_cache(app_module):
+    """Ages every cache entry past STALE_CACHE_DURATION so the next read must revalidate."""
+    cache = app_module.PLAYER_CACHE
+    with cache.lock:
+        for entry in cache.entries.values():
+            entry["timestamp"] -= cache.stale_ttl
+
+def run(args, fake_args):
+    fake = start_fake_riot(args.port, fake_args)
+    store_dir = tempfile.mkdtemp(prefix="soloq-bench-")
+    os.environ.update({
+        "RIOT_API_KEY": "bench",
+        "RIOT_REGION_URL": f"http://127.0.0.1:{args.port}",
+        "RIOT_PLATFORM_URL": f"http://127.0.0.1:{args.port + 1}",
+        "DDRAGON_URL": f"http://127.0.0.1:{args.port}",  # 404: el benchmark no necesita DDragon
+        "MATCH_STORE_DIR": store_dir,
+        "PIPELINE_ENGINE": args.engine,
+    })
+    os.environ.setdefault("RIOT_APP_RATE_LIMIT", args.app_limits)
+
+    logs = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else logs):
+            import app as app_module
+            baseline_rss = peak_rss_mb()
+            rng = random.Random(args.seed)
+            roster = [(f"Bench{i}", "EUW") for i in range(args.roster_size)]
+
+            report = {"config": {**vars(args), "fake_riot": fake_args}, "baseline_rss_mb": baseline_rss, "phases": {}}
+            for phase in args.phases:
+                if phase == "expired":
+                    expire_cache(app_module)
+                jobs = make_jobs(phase, roster, args.endpoint, args.requests, args.batch_size, rng)
+                before = upstream_stats(args.port)
+                result = run_phase(app_module, jobs, args.endpoint, args.concurrency)
+                result["upstream"] = upstream_delta(before, upstream_stats(args.port))
+                result["peak_rss_mb"] = peak_rss_mb()
+                report["phases"][phase] = result
+        report["cache"] = app_module.PLAYER_CACHE.stats()
+        return report
+    finally:
+        fake.terminate()
+        fake.wait()
+
+def print_report(report):
+    print(f"{'phase':8} {'reqs':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'upstream':>9} {'peak MB':>8}  statuses")
+    for phase, r in report["phases"].items():
+        print(f"{phase:8} {r['requests']:>5} {r['throughput_rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+              f"{r['p99_ms']:>8} {r['upstream']['calls']:>9} {r['peak_rss_mb']:>8}  {r['statuses']} partial={r['partial_players']}")
+    for phase, r in report["phases"].items():
+        print(f"  {phase} upstream: {r['upstream']['by_status']} ({r['upstream']['bytes'] / 1e6:.1f} MB)")
+    print(f"  baseline RSS {report['baseline_rss_mb']} MB, cache {report['cache']}")
+
+def compare(report, baseline, tolerance):
+    """Regressions vs a saved report: list of messages (empty if none)."""
+    regressions = []
+    for phase, r in report["phases"].items():
+        old = baseline.get("phases", {}).get(phase)
+        if not old:
+            continue
+        if r["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{phase}: p95 {old['p95_ms']} -> {r['p95_ms']} ms")
+        if r["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{phase}: throughput {old['throughput_rps']} -> {r['throughput_rps']} rps")
+        if r["upstream"]["calls"] > old["upstream"]["calls"] * (1 + tolerance):
+            regressions.append(f"{phase}: upstream calls {old['upstream']['calls']} -> {r['upstream']['calls']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the player endpoints against a fake Riot API.")
+    parser.add_argument('--endpoint', choices=("player", "players"), default="player", help="/api/player or /api/players (batch)")
+    parser.add_argument('--engine', choices=("threads", "async"), default="threads", help="PIPELINE_ENGINE of the app")
+    parser.add_argument('--roster-size', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=10, help="Simultaneous client requests")
+    parser.add_argument('--requests', type=int, default=200, help="Requests in the warm phase")
+    parser.add_argument('--batch-size', type=int, default=20, help="Players per /api/players request")
+    parser.add_argument('--phases', type=lambda v: v.split(","), default=list(PHASES), help="Comma-separated subset of cold,warm,expired")
+    parser.add_argument('--port', type=int, default=8787, help="Fake Riot regional port (platform = port + 1)")
+    parser.add_argument('--json', help="Save the report to this file")
+    parser.add_argument('--baseline', help="Compare with a saved report and fail on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative regression vs --baseline")
+    parser.add_argument('--verbose', action='store_true', help="Show the app logs")
+    fake_riot.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake_args = fake_riot.to_argv(args)  # Se le pasan tal cual al subproceso
+    report = run(args, fake_args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"[BENCH] Regression: {message}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
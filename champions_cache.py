@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+
+from encoded_body import EncodedBody
+
+# --- CHAMPIONS CACHE (DDragon) ---
+# La lista de campeones sólo cambia con cada parche. La guardamos en disco junto a la versión
+# de DDragon y la cargamos al arrancar; los refrescos van en segundo plano y usan una petición
+# condicional a versions.json (ETag / If-Modified-Since): champion.json sólo se vuelve a
+# descargar cuando el parche ha cambiado de verdad.
+
+DDRAGON_URL = os.environ.get('DDRAGON_URL', 'https://ddragon.leagueoflegends.com')
+
+class ChampionsCache:
+    """Disk-persisted DDragon champion list and metadata with conditional background refreshes."""
+
+    def __init__(self, session, directory, max_age=86400, timeout=5):
+        self.session = session
+        self.path = os.path.join(directory, 'champions.json')
+        self.max_age = max_age
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.refreshing = None  # threading.Event del refresco en curso (se activa al terminar)
+        self.state = {"version": None, "etag": None, "last_modified": None, "timestamp": 0, "champions": []}
+        self.index = {}
+        self.encoded = EncodedBody.from_data([])
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self._set_state(json.load(f))
+            print(f"[API] Champions loaded from disk: {len(self.state['champions'])} (v{self.state['version']})")
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[API] Cannot persist champions cache: {e}")
+
+    def _set_state(self, state):
+        # Índice por id de DDragon ("MonkeyKing"), nombre ("Wukong") y nombre sin símbolos ("KaiSa")
+        index = {}
+        for champ in state.get("champions", []):
+            for alias in (champ["id"], champ["name"], "".join(ch for ch in champ["name"] if ch.isalnum())):
+                index[alias.lower()] = champ
+        # /api/champions sirve estos bytes directamente (ver encoded_body.py)
+        encoded = EncodedBody.from_data([champ["name"] for champ in state.get("champions", [])])
+        with self.lock:
+            self.state = state
+            self.index = index
+            self.encoded = encoded
+
+    @property
+    def version(self):
+        return self.state["version"]
+
+    def names(self):
+        return [champ["name"] for champ in self.state["champions"]]
+
+    def lookup(self, name):
+        """Metadata {"id", "key", "name"} for a match-v5 championName or display name, or None."""
+        return self.index.get((name or "").lower())
+
+    def is_stale(self):
+        return time.time() - self.state["timestamp"] > self.max_age
+
+    def refresh(self):
+        """Conditional refresh. Only downloads champion.json when the DDragon version changed."""
+        state = dict(self.state)
+        headers = {}
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        version_resp = self.session.get(f"{DDRAGON_URL}/api/versions.json", headers=headers, timeout=self.timeout)
+        if version_resp.status_code == 304:
+            version = state["version"]
+        else:
+            version_resp.raise_for_status()
+            version = version_resp.json()[0]
+            state["etag"] = version_resp.headers.get("ETag")
+            state["last_modified"] = version_resp.headers.get("Last-Modified")
+
+        if version != state["version"] or not state["champions"]:
+            print(f"[API] Fetching champions list from DDragon (v{version})...")
+            data_resp = self.session.get(f"{DDRAGON_URL}/cdn/{version}/data/en_US/champion.json", timeout=self.timeout)
+            data_resp.raise_for_status()
+            state["champions"] = [
+                {"id": champ["id"], "key": champ["key"], "name": champ["name"]}
+                for champ in data_resp.json()["data"].values()
+            ]
+            state["version"] = version
+            print(f"[API] Champions cached: {len(state['champions'])}")
+
+        state["timestamp"] = time.time()
+        self._set_state(state)
+        self._save()
+
+    def _refresh_safely(self, done):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[API] Error fetching champions: {e}")
+        finally:
+            with self.lock:
+                self.refreshing = None
+            done.set()
+
+    def refresh_in_background(self):
+        """Starts a refresh unless one is already running. Returns the Event set when it finishes."""
+        with self.lock:
+            if self.refreshing:
+                return self.refreshing
+            done = self.refreshing = threading.Event()
+        threading.Thread(target=self._refresh_safely, args=(done,), name="champions-refresh", daemon=True).start()
+        return done
+
+    def ensure_loaded(self):
+        """Returns True if there is a champion list to serve. Only blocks on a fully cold start."""
+        if not self.state["champions"]:
+            # Sin nada en memoria ni en disco no queda otra que esperar a DDragon. Esperamos al refresco
+            # en curso (el de arranque o el de otra petición) en vez de lanzar uno más por petición;
+            # como mucho dos peticiones (versions.json + champion.json) de self.timeout cada una
+            self.refresh_in_background().wait(2 * self.timeout + 1)
+            return bool(self.state["champions"])
+        elif self.is_stale():
+            self.refresh_in_background()
+        return True
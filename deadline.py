@@ -0,0 +1,44 @@
+import time
+import contextvars
+from contextlib import contextmanager
+
+# --- REQUEST DEADLINE ---
+# Presupuesto de tiempo de una petición de principio a fin. Vive en un ContextVar, así que llega
+# a cada llamada a Riot aunque se haga en otro hilo (metrics.submit copia el contexto): fetch_data
+# recorta sus timeouts y esperas por rate limit a lo que queda, y el grafo de llamadas deja de
+# esperar cuando se acaba.
+
+DEADLINE = contextvars.ContextVar('deadline', default=None)  # instante time.monotonic() o None
+
+def remaining():
+    """Seconds left in the current budget (may be negative), or None without a deadline."""
+    deadline = DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def bounded(seconds):
+    """seconds capped by what is left of the budget, never below 0."""
+    left = remaining()
+    return seconds if left is None else max(0.0, min(seconds, left))
+
+@contextmanager
+def deadline(seconds):
+    """Budget for everything run inside. Nested budgets can only shorten it; None or 0 adds none."""
+    if not seconds:
+        yield
+        return
+    end = time.monotonic() + seconds
+    current = DEADLINE.get()
+    token = DEADLINE.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        DEADLINE.reset(token)
+
+@contextmanager
+def no_deadline():
+    """For background work (refreshes, backfills) started from a request with a budget."""
+    token = DEADLINE.set(None)
+    try:
+        yield
+    finally:
+        DEADLINE.reset(token)
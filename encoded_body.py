@@ -0,0 +1,66 @@
+import gzip
+import hashlib
+import threading
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: json produce el mismo documento, sólo más lento
+    orjson = None
+    import json
+
+try:
+    import brotli
+except ImportError:  # Sin brotli negociamos sólo gzip
+    brotli = None
+
+# --- PRE-SERIALIZED RESPONSES ---
+# Las respuestas cacheadas se serializan una sola vez al guardarlas: bytes JSON + ETag (hash del
+# contenido). Las variantes comprimidas se generan la primera vez que un cliente las pide y se
+# quedan guardadas con la entrada, así que un hit de caché ya no vuelve a pasar por jsonify ni
+# a comprimir, y un polling con If-None-Match se responde con un 304 vacío.
+
+MIN_COMPRESS_BYTES = 512  # Por debajo de esto comprimir no compensa las cabeceras
+
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=6)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+class EncodedBody:
+    """JSON bytes of one response with its content hash and lazily built compressed variants."""
+
+    __slots__ = ("body", "etag", "variants", "lock")
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.variants = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(dumps(data))
+
+    def __len__(self):
+        return len(self.body)
+
+    def negotiate(self, accept_encodings):
+        """(encoding, bytes) for a werkzeug Accept-Encoding object; encoding is None for identity."""
+        if len(self.body) < MIN_COMPRESS_BYTES:
+            return None, self.body
+        # br primero (si está instalado): comprime mejor que gzip para JSON
+        for encoding in ("br", "gzip"):
+            if encoding in COMPRESSORS and accept_encodings[encoding]:
+                return encoding, self.variant(encoding)
+        return None, self.body
+
+    def variant(self, encoding):
+        with self.lock:
+            body = self.variants.get(encoding)
+            if body is None:
+                body = self.variants[encoding] = COMPRESSORS[encoding](self.body)
+            return body
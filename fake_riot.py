@@ -0,0 +1,329 @@
+"""Local stand-in for the Riot API endpoints the app uses, for benchmarks (see benchmark.py).
+
+Serves account-v1, summoner-v4, league-v4, match-v5 ids and match-v5 on two ports (regional
+host and platform host, so the app's rate limiter sees two hosts like in production), with
+configurable latency, 429 injection with Retry-After, X-App/X-Method rate-limit headers and
+match payloads of realistic size (~50 KB, ~140 fields per participant).
+
+Players are synthetic: BenchN#<any tag> has puuid bench-N. A share of every player's games are
+five-stacks with the neighbouring players of the same group, so the match store and the
+multi-participant extraction are exercised too.
+
+    python fake_riot.py --port 8787 --latency lognormal:80:0.5 --error-rate 0.02
+    curl localhost:8787/__stats
+"""
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+GAMES_PER_PLAYER = 30  # Partidas de ranked que "tiene" cada jugador (start/count se aplican sobre estas)
+SEASON_START_MS = 1767830400000
+PREMADE_SIZE = 5
+TIERS = ("IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER")
+DIVISIONS = ("I", "II", "III", "IV")
+CHAMPIONS = ("Ahri", "Lux", "Zed", "Jinx", "Thresh", "LeeSin", "Kaisa", "MonkeyKing", "Ezreal", "Garen",
+             "Yasuo", "Leona", "Orianna", "Vi", "Darius", "Nautilus", "Caitlyn", "Sylas", "Ornn", "Viego")
+POSITIONS = ("TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY")
+
+def parse_latency(spec):
+    """'fixed:50', 'uniform:20:120', 'normal:80:20' or 'lognormal:80:0.5' (ms) -> sampler in seconds."""
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda rng: args[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1])) / 1000
+    if kind == "lognormal":
+        # args: mediana en ms y sigma; la cola larga se parece a la de Riot en hora punta
+        return lambda rng: rng.lognormvariate(math.log(args[0]), args[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class FakeRiot:
+    """Shared state of the fake server: config, rate-limit windows, payload cache and counters."""
+
+    def __init__(self, latency="lognormal:60:0.4", match_latency=None, error_rate=0.0, retry_after=1,
+                 app_limits="500:10,30000:600", method_limits="2000:10", enforce_limits=False,
+                 premade_ratio=0.3, seed=1):
+        self.latency = parse_latency(latency)
+        self.match_latency = parse_latency(match_latency) if match_latency else self.latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.app_limits = app_limits
+        self.method_limits = method_limits
+        self.enforce_limits = enforce_limits
+        self.premade_ratio = premade_ratio
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.windows = {}  # (host, family or None, window) -> [count, reset_at]
+        self.matches = {}  # match_id -> bytes
+        self.calls = Counter()  # "family status" -> n
+        self.bytes_sent = 0
+
+    # --- Rate limits ---
+    def _count(self, host, family, limits, now):
+        counts, exceeded = [], 0
+        for part in limits.split(","):
+            limit, window = (int(x) for x in part.split(":"))
+            slot = self.windows.setdefault((host, family, window), [0, now + window])
+            if now >= slot[1]:
+                slot[0], slot[1] = 0, now + window
+            slot[0] += 1
+            counts.append(f"{slot[0]}:{window}")
+            if slot[0] > limit:
+                exceeded = max(exceeded, math.ceil(slot[1] - now))
+        return ",".join(counts), exceeded
+
+    def admit(self, host, family):
+        """(status, headers) for one call: 200, or 429 from the enforced limits / random injection."""
+        now = time.time()
+        with self.lock:
+            app_count, app_wait = self._count(host, None, self.app_limits, now)
+            method_count, method_wait = self._count(host, family, self.method_limits, now)
+            injected = self.rng.random() < self.error_rate
+            delay = (self.match_latency if family == "match" else self.latency)(self.rng)
+        headers = {
+            "X-App-Rate-Limit": self.app_limits, "X-App-Rate-Limit-Count": app_count,
+            "X-Method-Rate-Limit": self.method_limits, "X-Method-Rate-Limit-Count": method_count,
+        }
+        if self.enforce_limits and (app_wait or method_wait):
+            headers.update({"Retry-After": str(max(app_wait, method_wait)),
+                            "X-Rate-Limit-Type": "application" if app_wait >= method_wait else "method"})
+            return 429, headers, 0
+        if injected:
+            # Como los 429 de "service" de Riot: sin límite superado por nuestra parte
+            headers.update({"Retry-After": str(self.retry_after), "X-Rate-Limit-Type": "service"})
+            return 429, headers, delay
+        return 200, headers, delay
+
+    def record(self, family, status, size):
+        with self.lock:
+            self.calls[f"{family} {status}"] += 1
+            self.bytes_sent += size
+
+    def stats(self):
+        with self.lock:
+            by_family = Counter()
+            for key, n in self.calls.items():
+                by_family[key.split()[0]] += n
+            return {"calls": sum(self.calls.values()), "by_family": dict(by_family),
+                    "by_status": dict(self.calls), "bytes_sent": self.bytes_sent}
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.bytes_sent = 0
+
+    # --- Synthetic data ---
+    def match_ids(self, index):
+        """Newest first. Premade games are shared by the 5 players of the same group."""
+        group = index // PREMADE_SIZE
+        ids = []
+        for game in range(GAMES_PER_PLAYER):
+            if (game * 37 % 100) < self.premade_ratio * 100:
+                ids.append(f"EUW1_{group * 1000 + game}")
+            else:
+                ids.append(f"EUW1_{10_000_000 + index * 1000 + game}")
+        return ids
+
+    def match_participants(self, number):
+        if number >= 10_000_000:
+            return [(number - 10_000_000) // 1000]
+        group = number // 1000
+        return list(range(group * PREMADE_SIZE, (group + 1) * PREMADE_SIZE))
+
+    def match_body(self, match_id):
+        with self.lock:
+            body = self.matches.get(match_id)
+        if body is not None:
+            return body
+        number = int(match_id.split("_")[1])
+        game = number % 1000
+        rng = random.Random(f"{self.seed}:{match_id}")
+        players = self.match_participants(number)
+        duration = rng.randint(1200, 2400)
+        blue_wins = rng.random() < 0.5
+        participants = []
+        for slot in range(10):
+            win = (slot < 5) == blue_wins
+            p = {
+                "puuid": f"bench-{players[slot]}" if slot < len(players) else f"filler-{match_id}-{slot}",
+                "win": win, "teamId": 100 if slot < 5 else 200,
+                "championName": rng.choice(CHAMPIONS), "teamPosition": POSITIONS[slot % 5],
+                "kills": rng.randint(0, 15), "deaths": rng.randint(0, 12), "assists": rng.randint(0, 20),
+                "totalMinionsKilled": rng.randint(20, 300), "neutralMinionsKilled": rng.randint(0, 150),
+                "goldEarned": rng.randint(6000, 18000), "totalDamageDealtToChampions": rng.randint(5000, 50000),
+                "pentaKills": 0, "quadraKills": int(rng.random() < 0.02), "tripleKills": int(rng.random() < 0.1),
+                **{f"item{i}": rng.randint(1000, 7000) for i in range(7)},
+                # Relleno con la forma del payload real: ~100 contadores + challenges + perks
+                **{f"stat{i}": rng.randint(0, 100000) for i in range(100)},
+                "challenges": {f"challenge{i}": rng.random() * 100 for i in range(120)},
+                "perks": {"statPerks": {"defense": 5002, "flex": 5008, "offense": 5005},
+                          "styles": [{"description": "primaryStyle", "style": 8100,
+                                      "selections": [{"perk": 8112 + i, "var1": rng.randint(0, 3000), "var2": 0, "var3": 0}
+                                                     for i in range(4)]}]},
+            }
+            participants.append(p)
+        data = {
+            "metadata": {"matchId": match_id, "participants": [p["puuid"] for p in participants]},
+            "info": {
+                "gameCreation": SEASON_START_MS + (GAMES_PER_PLAYER - game) * 3_600_000,
+                "gameDuration": duration, "queueId": 420, "gameVersion": "16.1.1",
+                "participants": participants,
+                "teams": [{"teamId": t, "win": (t == 100) == blue_wins,
+                           "objectives": {o: {"first": False, "kills": rng.randint(0, 10)}
+                                          for o in ("baron", "dragon", "tower", "inhibitor", "riftHerald", "champion")}}
+                          for t in (100, 200)],
+            },
+        }
+        body = json.dumps(data).encode()
+        with self.lock:
+            if len(self.matches) > 5000:
+                self.matches.clear()
+            self.matches[match_id] = body
+        return body
+
+    def route(self, path, query):
+        """(family, body_bytes or None) for a Riot path."""
+        m = re.match(r"/riot/account/v1/accounts/by-riot-id/([^/]+)/([^/]+)$", path)
+        if m:
+            name = m.group(1)
+            index = re.search(r"(\d+)$", name)
+            if not index:
+                return "account", None
+            return "account", json.dumps({"puuid": f"bench-{int(index.group(1))}", "gameName": name, "tagLine": m.group(2)}).encode()
+        m = re.match(r"/lol/summoner/v4/summoners/by-puuid/bench-(\d+)$", path)
+        if m:
+            return "summoner", json.dumps({"puuid": f"bench-{m.group(1)}", "profileIconId": 29,
+                                           "summonerLevel": 30 + int(m.group(1)) % 500, "revisionDate": 0}).encode()
+        m = re.match(r"/lol/league/v4/entries/by-puuid/bench-(\d+)$", path)
+        if m:
+            rng = random.Random(f"{self.seed}:league:{m.group(1)}")
+            wins, losses = rng.randint(10, 200), rng.randint(10, 200)
+            return "league", json.dumps([{
+                "queueType": "RANKED_SOLO_5x5", "tier": rng.choice(TIERS), "rank": rng.choice(DIVISIONS),
+                "leaguePoints": rng.randint(0, 99), "wins": wins, "losses": losses,
+                "hotStreak": rng.random() < 0.1, "veteran": False, "freshBlood": False, "inactive": False,
+            }]).encode()
+        m = re.match(r"/lol/match/v5/matches/by-puuid/bench-(\d+)/ids$", path)
+        if m:
+            ids = self.match_ids(int(m.group(1)))
+            if "startTime" in query:
+                since_ms = int(query["startTime"]) * 1000
+                ids = [mid for mid in ids if self.game_creation(mid) > since_ms]
+            start, count = int(query.get("start", 0)), int(query.get("count", 20))
+            return "match-ids", json.dumps(ids[start:start + count]).encode()
+        m = re.match(r"/lol/match/v5/matches/(EUW1_\d+)$", path)
+        if m:
+            return "match", self.match_body(m.group(1))
+        return "other", None
+
+    @staticmethod
+    def game_creation(match_id):
+        return SEASON_START_MS + (GAMES_PER_PLAYER - int(match_id.split("_")[1]) % 1000) * 3_600_000
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como el HTTP_SESSION de la app
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "application/json;charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path, _, qs = self.path.partition("?")
+            if path == "/__stats":
+                return self.send(200, json.dumps(fake.stats()).encode())
+            query = dict(kv.split("=", 1) for kv in qs.split("&") if "=" in kv)
+
+            family, body = fake.route(path, query)
+            status, headers, delay = fake.admit(self.server.server_address[1], family)
+            time.sleep(delay)
+            if status == 429:
+                body = json.dumps({"status": {"message": "Rate limit exceeded", "status_code": 429}}).encode()
+            elif body is None:
+                status, body = 404, json.dumps({"status": {"message": "Data not found", "status_code": 404}}).encode()
+            fake.record(family, status, len(body))
+            self.send(status, body, headers)
+
+        def do_POST(self):
+            if self.path == "/__reset":
+                fake.reset()
+                return self.send(200, b"{}")
+            self.send(404)
+
+    return Handler
+
+def serve(fake, port, host="127.0.0.1"):
+    """Starts the regional (port) and platform (port + 1) servers in daemon threads."""
+    servers = []
+    for p in (port, port + 1):
+        server = ThreadingHTTPServer((host, p), make_handler(fake))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name=f"fake-riot-{p}", daemon=True).start()
+        servers.append(server)
+    return servers
+
+def add_arguments(parser):
+    parser.add_argument('--latency', default="lognormal:60:0.4", help="fixed:MS | uniform:MIN:MAX | normal:MEAN:SD | lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--match-latency', help="Latency distribution for match-v5 only (default: --latency)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of calls answered with an injected 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds of injected 429s")
+    parser.add_argument('--app-limits', default="500:10,30000:600", help="X-App-Rate-Limit advertised (production key)")
+    parser.add_argument('--method-limits', default="2000:10", help="X-Method-Rate-Limit advertised")
+    parser.add_argument('--enforce-limits', action='store_true', help="Answer 429 when the advertised limits are exceeded")
+    parser.add_argument('--premade-ratio', type=float, default=0.3, help="Share of games played as a five-stack")
+    parser.add_argument('--seed', type=int, default=1)
+
+def to_argv(args):
+    """The add_arguments() options of a parsed namespace back as a command line."""
+    argv = [
+        '--latency', args.latency, '--error-rate', str(args.error_rate), '--retry-after', str(args.retry_after),
+        '--app-limits', args.app_limits, '--method-limits', args.method_limits,
+        '--premade-ratio', str(args.premade_ratio), '--seed', str(args.seed),
+    ]
+    if args.match_latency:
+        argv += ['--match-latency', args.match_latency]
+    if args.enforce_limits:
+        argv.append('--enforce-limits')
+    return argv
+
+def from_args(args):
+    return FakeRiot(
+        latency=args.latency, match_latency=args.match_latency, error_rate=args.error_rate,
+        retry_after=args.retry_after, app_limits=args.app_limits, method_limits=args.method_limits,
+        enforce_limits=args.enforce_limits, premade_ratio=args.premade_ratio, seed=args.seed,
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Riot API for local benchmarks.")
+    parser.add_argument('--port', type=int, default=8787, help="Regional host port (platform host = port + 1)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    serve(from_args(args), args.port)
+    print(f"[FAKE RIOT] Regional http://127.0.0.1:{args.port}  Platform http://127.0.0.1:{args.port + 1}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from deadline import remaining
+
+# --- FETCH GRAPH ---
+# El pipeline de un jugador se declara como un grafo de llamadas:
+#   account -> delta -> {summoner, league, match_ids} -> matches (una tarea por partida)
+# Cada nodo sale hacia el executor en cuanto sus dependencias han terminado, así el camino
+# crítico es el más corto posible. Un nodo que supera su timeout (o el deadline de la petición,
+# ver deadline.py) toma su valor por defecto y sus dependientes continúan con él. En los nodos
+# de fan-out, una tarea que tarda más de hedge_after se duplica y gana la primera respuesta.
+
+class FetchGraph:
+    """Dependency graph of upstream calls, run on an executor as soon as each node's inputs are ready."""
+
+    def __init__(self, executor, submit=None, on_done=None, on_hedge=None):
+        self.executor = executor
+        self.submit = submit or (lambda executor, fn, *args: executor.submit(fn, *args))
+        self.on_done = on_done  # on_done(name, seconds, timed_out), p.ej. para métricas
+        self.on_hedge = on_hedge  # on_hedge(name)
+        self.nodes = {}
+        self.timed_out = set()  # Nodos que acabaron (del todo o en parte) con su valor por defecto
+        self.missing = {}  # Nodo de fan-out -> nº de elementos que se quedaron sin respuesta
+        self.abandoned = []  # Tareas que seguían en curso cuando run() devolvió
+
+    def add(self, name, fn, deps=(), timeout=None, default=None, stop_if=None):
+        """Node whose value is fn(results). If stop_if(value) is true, nothing else is started."""
+        self.nodes[name] = {"fn": fn, "over": None, "deps": tuple(deps), "timeout": timeout,
+                            "default": default, "stop_if": stop_if, "hedge": None, "hedge_after": None}
+        return self
+
+    def map(self, name, fn, over, deps=(), timeout=None, default=None, hedge=None, hedge_after=None):
+        """Fan-out node: fn(item, results) for each item of over(results), each with its own timeout.
+
+        The value is the list of results in item order (default for the ones that timed out). With
+        hedge and hedge_after, an item still running after hedge_after seconds also gets
+        hedge(item, results) and the first non-None answer wins.
+        """
+        self.nodes[name] = {"fn": fn, "over": over, "deps": tuple(deps), "timeout": timeout,
+                            "default": default, "stop_if": None, "hedge": hedge, "hedge_after": hedge_after}
+        return self
+
+    def run(self):
+        """Runs the graph and returns (results, stopped_at) with stopped_at None if it ran to the end."""
+        results = {}
+        waiting = dict(self.nodes)
+        pending = {}  # future -> (name, index)  (index None en nodos simples)
+        deadlines = {}  # (name, index) -> instante perf_counter() o None, mientras siga abierto
+        hedge_at = {}  # (name, index) -> instante en que se lanza el duplicado
+        items = {}  # (name, index) -> elemento del fan-out
+        fan_out = {}  # name -> {"values", "left"}
+        started = {}
+
+        budget = remaining()
+        graph_deadline = time.perf_counter() + max(0.0, budget) if budget is not None else None
+
+        def node_deadline(node, now):
+            ends = [end for end in (now + node["timeout"] if node["timeout"] else None, graph_deadline) if end is not None]
+            return min(ends) if ends else None
+
+        def finish(name, value, timed_out=False):
+            results[name] = value
+            if timed_out:
+                self.timed_out.add(name)
+            if self.on_done:
+                self.on_done(name, time.perf_counter() - started[name], timed_out)
+            stop_if = self.nodes[name]["stop_if"]
+            return stop_if is not None and stop_if(value)
+
+        def resolve(key, value, timed_out):
+            """Closes one task (and its hedge). Returns True if the graph must stop."""
+            deadlines.pop(key, None)
+            hedge_at.pop(key, None)
+            for future in [f for f, k in pending.items() if k == key]:
+                del pending[future]
+                self.abandoned.append(future)
+            name, index = key
+            if index is None:
+                return finish(name, value, timed_out)
+            state = fan_out[name]
+            state["values"][index] = value
+            if timed_out:
+                self.missing[name] = self.missing.get(name, 0) + 1
+            state["left"] -= 1
+            return not state["left"] and finish(name, state["values"], name in self.missing)
+
+        def launch_ready():
+            """Starts every node whose dependencies are done. Returns the name of a stopping node or None."""
+            launched = True
+            while launched:
+                launched = False
+                for name, node in list(waiting.items()):
+                    if not all(dep in results for dep in node["deps"]):
+                        continue
+                    del waiting[name]
+                    launched = True
+                    now = time.perf_counter()
+                    started[name] = now
+                    if node["over"] is None:
+                        pending[self.submit(self.executor, node["fn"], results)] = (name, None)
+                        deadlines[(name, None)] = node_deadline(node, now)
+                        continue
+                    node_items = list(node["over"](results) or [])
+                    if not node_items:
+                        if finish(name, []):
+                            return name
+                        continue
+                    fan_out[name] = {"values": [node["default"]] * len(node_items), "left": len(node_items)}
+                    for index, item in enumerate(node_items):
+                        key = (name, index)
+                        items[key] = item
+                        pending[self.submit(self.executor, node["fn"], item, results)] = key
+                        deadlines[key] = node_deadline(node, now)
+                        if node["hedge"] and node["hedge_after"]:
+                            hedge_at[key] = now + node["hedge_after"]
+            return None
+
+        stopped_at = launch_ready()
+        while deadlines and stopped_at is None:
+            wakeups = [end for end in deadlines.values() if end is not None] + list(hedge_at.values())
+            timeout = max(0, min(wakeups) - time.perf_counter()) if wakeups else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+
+            for future in done:
+                key = pending.get(future)
+                if key is None:
+                    continue  # Su gemela (hedge) ya cerró la tarea
+                value = future.result()
+                del pending[future]
+                if value is None and key in pending.values():
+                    continue  # Ha fallado una de las dos: esperamos a la otra
+                if resolve(key, value, False):
+                    stopped_at = key[0]
+                    break
+
+            if stopped_at is None:
+                for key, end in list(deadlines.items()):
+                    if end is not None and now >= end:
+                        if resolve(key, self.nodes[key[0]]["default"], True):
+                            stopped_at = key[0]
+                            break
+
+            if stopped_at is None:
+                for key, at in list(hedge_at.items()):
+                    if now >= at and key in deadlines:
+                        del hedge_at[key]
+                        name = key[0]
+                        pending[self.submit(self.executor, self.nodes[name]["hedge"], items[key], results)] = key
+                        if self.on_hedge:
+                            self.on_hedge(name)
+
+            if stopped_at is None:
+                stopped_at = launch_ready()
+
+        self.abandoned += list(pending)
+        return results, stopped_at
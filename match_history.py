@@ -0,0 +1,150 @@
+from array import array
+from collections import Counter
+
+# --- SEASON HISTORY (columnar) ---
+# Para cientos de partidas no guardamos un dict por partida: cada campo es una columna
+# array() de enteros y campeones/posiciones se guardan como índice a una tabla interna.
+# Todos los agregados salen de una sola pasada sobre las columnas.
+
+class MatchHistory:
+    """Compact array-backed store of one player's processed matches, newest first."""
+
+    __slots__ = (
+        "win", "kills", "deaths", "assists", "cs", "gold", "damage", "duration", "creation",
+        "champion", "position", "champion_names", "champion_index", "position_names", "position_index",
+    )
+
+    def __init__(self):
+        self.win = array('b')
+        self.kills = array('H')
+        self.deaths = array('H')
+        self.assists = array('H')
+        self.cs = array('H')
+        self.gold = array('I')
+        self.damage = array('I')
+        self.duration = array('I')
+        self.creation = array('q')
+        self.champion = array('H')
+        self.position = array('B')
+        self.champion_names, self.champion_index = [], {}
+        self.position_names, self.position_index = [], {}
+
+    def __len__(self):
+        return len(self.win)
+
+    @staticmethod
+    def _intern(value, names, index):
+        if value not in index:
+            index[value] = len(names)
+            names.append(value)
+        return index[value]
+
+    def append(self, stats):
+        """Adds one match in the fetch_and_process_match() format (call in newest-first order)."""
+        self.win.append(1 if stats.get('win') else 0)
+        self.kills.append(stats.get('kills', 0))
+        self.deaths.append(stats.get('deaths', 0))
+        self.assists.append(stats.get('assists', 0))
+        self.cs.append(stats.get('cs', 0))
+        self.gold.append(stats.get('gold', 0))
+        self.damage.append(stats.get('damage', 0))
+        self.duration.append(stats.get('gameDuration', 0))
+        self.creation.append(stats.get('gameCreation', 0))
+        self.champion.append(self._intern(stats.get('championName') or 'Unknown', self.champion_names, self.champion_index))
+        self.position.append(self._intern(stats.get('teamPosition') or '', self.position_names, self.position_index))
+
+    def summary(self, top_champs=10, form_window=10, form_points=20):
+        """Season aggregates: totals, KDA, per-champion and per-role winrates, streak and rolling form."""
+        games = len(self)
+        if not games:
+            return {"games": 0}
+
+        champ = [[0, 0, 0, 0, 0] for _ in self.champion_names]  # games, wins, kills, deaths, assists
+        role = [[0, 0] for _ in self.position_names]  # games, wins
+        kills = deaths = assists = cs = damage = duration = 0
+        streak_win, streak = self.win[0], 0
+        streak_open = True
+
+        for i in range(games):
+            w = self.win[i]
+            k, d, a = self.kills[i], self.deaths[i], self.assists[i]
+            kills += k
+            deaths += d
+            assists += a
+            cs += self.cs[i]
+            damage += self.damage[i]
+            duration += self.duration[i]
+
+            c = champ[self.champion[i]]
+            c[0] += 1
+            c[1] += w
+            c[2] += k
+            c[3] += d
+            c[4] += a
+
+            r = role[self.position[i]]
+            r[0] += 1
+            r[1] += w
+
+            if streak_open:
+                if w == streak_win:
+                    streak += 1
+                else:
+                    streak_open = False
+
+        wins = sum(self.win)
+        minutes = duration / 60 if duration else 0
+
+        champions = sorted(
+            (
+                {
+                    "name": self.champion_names[idx],
+                    "games": g, "wins": cw, "losses": g - cw,
+                    "winrate": int(cw / g * 100),
+                    "kda": round((ck + ca) / cd, 2) if cd else round(ck + ca, 2),
+                }
+                for idx, (g, cw, ck, cd, ca) in enumerate(champ)
+            ),
+            key=lambda c: c["games"], reverse=True
+        )[:top_champs]
+
+        roles = sorted(
+            (
+                {"role": self.position_names[idx], "games": g, "wins": rw, "winrate": int(rw / g * 100)}
+                for idx, (g, rw) in enumerate(role) if self.position_names[idx]
+            ),
+            key=lambda r: r["games"], reverse=True
+        )
+
+        # Winrate móvil de form_window partidas, del punto más antiguo al más reciente
+        form = []
+        if games >= form_window:
+            window_wins = sum(self.win[games - form_window:])
+            form.append(window_wins)
+            for start in range(games - form_window - 1, -1, -1):
+                window_wins += self.win[start] - self.win[start + form_window]
+                form.append(window_wins)
+            form = [int(w / form_window * 100) for w in form[-form_points:]]
+
+        return {
+            "games": games,
+            "wins": wins,
+            "losses": games - wins,
+            "winrate": int(wins / games * 100),
+            "kda": round((kills + assists) / deaths, 2) if deaths else round(kills + assists, 2),
+            "avg_k": round(kills / games, 1),
+            "avg_d": round(deaths / games, 1),
+            "avg_a": round(assists / games, 1),
+            "cs_per_min": round(cs / minutes, 1) if minutes else None,
+            "damage_per_min": round(damage / minutes) if minutes else None,
+            "current_streak": {"type": "Win" if streak_win else "Loss", "count": streak},
+            "main_role": roles[0]["role"] if roles else "FILL",
+            "champions": champions,
+            "roles": roles,
+            "form": form,
+        }
+
+def main_role(positions):
+    """Most played position in one pass (ties go to the most recent), or FILL."""
+    counts = Counter(p for p in positions if p)
+    return counts.most_common(1)[0][0] if counts else "FILL"
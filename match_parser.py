@@ -0,0 +1,29 @@
+try:
+    import orjson as _json
+except ImportError:  # orjson es opcional: con json funciona igual, sólo más lento
+    import json as _json
+
+# --- LEAN MATCH PARSER ---
+# Un match-v5 trae 10 participantes con más de cien campos cada uno (challenges, perks...)
+# más datos de equipos y objetivos. Sólo usamos ~20 campos: decodificamos con orjson
+# (mucho menos tiempo con el GIL cogido) y nos quedamos con una copia mínima, de modo que
+# el documento completo se libera nada más parsearlo en vez de viajar por el pipeline.
+
+# Campos que lee extract_participant_stats() en app.py
+PARTICIPANT_FIELDS = (
+    "puuid", "win", "kills", "deaths", "assists", "championName",
+    "totalMinionsKilled", "neutralMinionsKilled", "goldEarned", "totalDamageDealtToChampions",
+    "item0", "item1", "item2", "item3", "item4", "item5", "item6",
+    "teamPosition", "pentaKills", "quadraKills", "tripleKills",
+)
+INFO_FIELDS = ("gameCreation", "gameDuration")
+
+def parse_match(raw):
+    """Raw match-v5 bytes -> {"info": {gameCreation, gameDuration, participants: [slim dicts]}}."""
+    info = _json.loads(raw).get("info") or {}
+    slim = {field: info[field] for field in INFO_FIELDS if field in info}
+    slim["participants"] = [
+        {field: p[field] for field in PARTICIPANT_FIELDS if field in p}
+        for p in info.get("participants", [])
+    ]
+    return {"info": slim}
@@ -0,0 +1,102 @@
+import os
+import json
+import sqlite3
+import time
+import tempfile
+import threading
+
+# --- PERSISTENT MATCH STORE ---
+# Una partida terminada no cambia nunca: guardamos las stats ya extraídas de los 10
+# participantes por match_id y así sólo pedimos a Riot las partidas que no hemos visto.
+# También recuerda name#tag -> PUUID y el último estado calculado de cada jugador para
+# poder refrescar de forma incremental.
+# En Vercel el único directorio escribible es /tmp, que sobrevive entre invocaciones "warm".
+MATCH_STORE_DIR = os.environ.get('MATCH_STORE_DIR', os.path.join(tempfile.gettempdir(), 'soloq'))
+
+class MatchStore:
+    """SQLite store of per-participant match stats (append-only), accounts and player state."""
+
+    def __init__(self, directory=MATCH_STORE_DIR):
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, 'matches.sqlite3')
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            # Sistema de ficheros de solo lectura: seguimos funcionando en memoria
+            print(f"[STORE] Cannot open match store in {directory}: {e}. Using in-memory store.")
+            self.path = ':memory:'
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS participants ("
+                " match_id TEXT NOT NULL,"
+                " puuid TEXT NOT NULL,"
+                " stats TEXT NOT NULL,"
+                " PRIMARY KEY (match_id, puuid))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS accounts ("
+                " riot_id TEXT PRIMARY KEY,"
+                " puuid TEXT NOT NULL,"
+                " game_name TEXT,"
+                " timestamp REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS player_state ("
+                " puuid TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " refreshed_at REAL NOT NULL)"
+            )
+
+    def get_many(self, match_id, puuids):
+        """Returns (known, {puuid: stats}) for the requested PUUIDs that played the match."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT puuid, stats FROM participants WHERE match_id = ?", (match_id,)
+            ).fetchall()
+        return bool(rows), {p: json.loads(s) for p, s in rows if p in puuids}
+
+    def put(self, match_id, participants):
+        """Stores {puuid: stats} for a finished match. Existing rows are never overwritten."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO participants (match_id, puuid, stats) VALUES (?, ?, ?)",
+                [(match_id, puuid, json.dumps(stats)) for puuid, stats in participants.items()]
+            )
+
+    def get_account(self, riot_id, max_age):
+        """Returns (puuid, game_name) for a lowercased name#tag, or None if unknown or too old."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT puuid, game_name, timestamp FROM accounts WHERE riot_id = ?", (riot_id,)
+            ).fetchone()
+        if not row or time.time() - row[2] > max_age:
+            return None
+        return row[0], row[1]
+
+    def put_account(self, riot_id, puuid, game_name):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO accounts (riot_id, puuid, game_name, timestamp) VALUES (?, ?, ?, ?)",
+                (riot_id, puuid, game_name, time.time())
+            )
+
+    def get_player_state(self, puuid):
+        """Last full response built for a PUUID: {"data": ..., "refreshed_at": ...} or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data, refreshed_at FROM player_state WHERE puuid = ?", (puuid,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"data": json.loads(row[0]), "refreshed_at": row[1]}
+
+    def put_player_state(self, puuid, data, refreshed_at):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO player_state (puuid, data, refreshed_at) VALUES (?, ?, ?)",
+                (puuid, json.dumps(data), refreshed_at)
+            )
@@ -0,0 +1,156 @@
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- METRICS (Prometheus text format) ---
+# Contadores e histogramas en memoria de proceso, sin dependencias: /api/metrics los vuelca en el
+# formato de texto de Prometheus. Los valores que ya llevan otros objetos (contadores de
+# PLAYER_CACHE, colas de los executors...) se leen en el momento del volcado con callbacks.
+# Con TRACE_LOGS=1 cada petición lleva un trace id que aparece en todos sus logs (ver log()).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+TRACE_ID = contextvars.ContextVar('trace_id', default=None)
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.values.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(round(series[-2], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class Callback(Metric):
+    """Value(s) read at scrape time: fn() returns a number or {label_values_tuple: number}."""
+
+    def __init__(self, name, documentation, fn, labelnames=(), type="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+        self.type = type
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in sorted(values.items()) if v is not None
+        ]
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, fn, labelnames=(), type="gauge"):
+        return self.register(Callback(name, documentation, fn, labelnames, type))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.header() + metric.samples()
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# --- Trace ids ---
+def new_trace_id(incoming=None):
+    return (incoming or uuid.uuid4().hex[:12])[:64]
+
+def log(message):
+    """print() with the current request's trace id, if any."""
+    trace_id = TRACE_ID.get()
+    print(f"[{trace_id}] {message}" if trace_id else message)
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit() that keeps the caller's trace id (contextvars) in the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import OrderedDict
+
+from encoded_body import EncodedBody
+
+# --- PLAYER CACHE (LRU + stale-while-revalidate) ---
+# Cada entrada pasa por tres estados según su edad:
+#   fresh   (< fresh_ttl): se sirve tal cual.
+#   stale   (< stale_ttl): se sirve al momento y se refresca en segundo plano.
+#   expired (>= stale_ttl): hay que refrescar antes de responder, pero se guarda para
+#                           servirla si Riot falla (429 / 5xx).
+# Al superar max_entries o max_bytes se expulsa la entrada usada hace más tiempo (y se avisa a on_evict).
+# Cada entrada guarda también su respuesta ya serializada (EncodedBody) para servirla sin jsonify.
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+MISS = "miss"
+
+class PlayerCache:
+    """Bounded LRU cache of player responses with fresh/stale TTLs and hit/miss/stale counters."""
+
+    def __init__(self, fresh_ttl, stale_ttl, max_entries=500, max_bytes=0, on_evict=None):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # 0 = sin límite de tamaño
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> {"data", "encoded", "timestamp", "size"}
+        self.total_bytes = 0
+        self.refreshing = set()
+        self.counters = {"hits": 0, "stale": 0, "misses": 0, "evictions": 0, "fallbacks": 0}
+        self.on_evict = on_evict  # callback(keys) con las claves expulsadas, fuera del lock
+
+    def _status(self, entry, now):
+        age = now - entry["timestamp"]
+        if age < self.fresh_ttl:
+            return FRESH
+        if age < self.stale_ttl:
+            return STALE
+        return EXPIRED
+
+    def get(self, key):
+        """Returns (data, status). data is None only on a miss."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None, MISS
+            self.entries.move_to_end(key)
+            status = self._status(entry, now)
+            self.counters[{FRESH: "hits", STALE: "stale", EXPIRED: "misses"}[status]] += 1
+            return entry["data"], status
+
+    def status(self, key):
+        """Like get() but only the status, without touching the counters or the LRU order."""
+        with self.lock:
+            entry = self.entries.get(key)
+            return self._status(entry, time.time()) if entry else MISS
+
+    def get_fresh(self, key):
+        """Fresh data or None, without touching the counters (for re-checks inside the pipeline)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and self._status(entry, time.time()) == FRESH:
+                return entry["data"]
+        return None
+
+    def peek(self, key):
+        """Data in any state (or None), without touching the counters or the LRU order."""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry["data"] if entry else None
+
+    def mark_stale(self, key, data):
+        """Replaces the data of an existing entry and makes it stale, so the next read revalidates it."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                entry["data"] = data
+                entry["encoded"] = None  # Se vuelve a serializar en el próximo encoded()
+                entry["timestamp"] = min(entry["timestamp"], time.time() - self.fresh_ttl)
+
+    def encoded(self, key, data):
+        """Pre-serialized body for data: the stored one if data is this entry's current data."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["data"] is not data:
+                return EncodedBody.from_data(data)
+            if entry["encoded"] is None:
+                entry["encoded"] = EncodedBody.from_data(data)
+            return entry["encoded"]
+
+    def age(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return time.time() - entry["timestamp"] if entry else None
+
+    def set(self, key, data):
+        # Serializamos una vez aquí, fuera del lock; sirve para las respuestas y para medir el tamaño
+        encoded = EncodedBody.from_data(data)
+        size = len(encoded)
+        evicted_keys = []
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.total_bytes -= old["size"]
+            self.entries[key] = {"data": data, "encoded": encoded, "timestamp": time.time(), "size": size}
+            self.total_bytes += size
+            while len(self.entries) > 1 and (
+                len(self.entries) > self.max_entries or (self.max_bytes and self.total_bytes > self.max_bytes)
+            ):
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted["size"]
+                self.counters["evictions"] += 1
+                evicted_keys.append(evicted_key)
+        if evicted_keys and self.on_evict:
+            self.on_evict(evicted_keys)
+
+    def start_refresh(self, key):
+        """True if the caller should launch the background refresh (only one per key at a time)."""
+        with self.lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self.lock:
+            self.refreshing.discard(key)
+
+    def count_fallback(self):
+        with self.lock:
+            self.counters["fallbacks"] += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["stale"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hit_ratio": round((self.counters["hits"] + self.counters["stale"]) / lookups, 3) if lookups else None,
+            }
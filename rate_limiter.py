@@ -0,0 +1,134 @@
+import time
+import threading
+import urllib.parse
+
+# --- RIOT RATE LIMITER ---
+# Riot aplica límites por aplicación (por routing host: europe, euw1...) y por método
+# (familia de endpoint dentro de cada host), y nos dice en cada respuesta cuánto llevamos:
+#   X-App-Rate-Limit: 20:1,100:120        X-App-Rate-Limit-Count: 3:1,40:120
+#   X-Method-Rate-Limit: 2000:10          X-Method-Rate-Limit-Count: 1:10
+# Todos los hilos piden turno aquí antes de salir hacia Riot, así casi nunca vemos un 429.
+
+ENDPOINT_FAMILIES = {
+    "/riot/account/": "account",
+    "/lol/summoner/": "summoner",
+    "/lol/league/": "league",
+    "/lol/match/": "match",
+}
+
+def parse_rate_limits(value):
+    """'20:1,100:120' -> [(20, 1), (100, 120)] as (amount, window_seconds) pairs."""
+    limits = []
+    for part in (value or "").split(","):
+        try:
+            amount, window = part.strip().split(":")
+            limits.append((int(amount), int(window)))
+        except ValueError:
+            continue
+    return limits
+
+def endpoint_key(url):
+    """(routing host, endpoint family) for a Riot API URL."""
+    parsed = urllib.parse.urlsplit(url)
+    family = next((f for prefix, f in ENDPOINT_FAMILIES.items() if parsed.path.startswith(prefix)), "other")
+    return parsed.netloc, family
+
+class RateLimitBucket:
+    """Fixed-window counters for one limit set, e.g. 20 per 1s and 100 per 120s."""
+
+    def __init__(self, limits=()):
+        self.windows = {}  # window_seconds -> {"limit", "count", "reset_at"}
+        self.blocked_until = 0
+        self.set_limits(limits)
+
+    def set_limits(self, limits):
+        for amount, window in limits:
+            entry = self.windows.setdefault(window, {"limit": amount, "count": 0, "reset_at": 0})
+            entry["limit"] = amount
+
+    def wait_time(self, now):
+        """Seconds until one more request fits in every window (0 if it fits now)."""
+        wait = max(0, self.blocked_until - now)
+        for entry in self.windows.values():
+            if entry["reset_at"] and now >= entry["reset_at"]:
+                entry["count"] = 0
+                entry["reset_at"] = 0
+            if entry["count"] >= entry["limit"]:
+                wait = max(wait, entry["reset_at"] - now)
+        return wait
+
+    def consume(self, now):
+        for window, entry in self.windows.items():
+            if not entry["reset_at"]:
+                entry["reset_at"] = now + window
+            entry["count"] += 1
+
+    def sync(self, counts, now):
+        """Adopts Riot's view of the counters when it is ahead of ours (other instances, retries...)."""
+        for count, window in counts:
+            entry = self.windows.get(window)
+            if entry and count > entry["count"]:
+                entry["count"] = count
+                if not entry["reset_at"]:
+                    entry["reset_at"] = now + window
+
+class RateLimiter:
+    """Process-wide limiter with one app bucket per routing host and one method bucket per (host, family)."""
+
+    def __init__(self, default_app_limits=()):
+        self.cond = threading.Condition()
+        self.default_app_limits = default_app_limits
+        self.app_buckets = {}
+        self.method_buckets = {}
+
+    def _buckets(self, url):
+        host, family = endpoint_key(url)
+        if host not in self.app_buckets:
+            self.app_buckets[host] = RateLimitBucket(self.default_app_limits)
+        if (host, family) not in self.method_buckets:
+            # Hasta ver la primera respuesta no sabemos el límite del método
+            self.method_buckets[(host, family)] = RateLimitBucket()
+        return self.app_buckets[host], self.method_buckets[(host, family)]
+
+    def try_acquire(self, url):
+        """Takes a turn if one is free right now and returns 0; otherwise returns the seconds to wait."""
+        with self.cond:
+            now = time.monotonic()
+            buckets = self._buckets(url)
+            wait = max(b.wait_time(now) for b in buckets)
+            if wait <= 0:
+                for b in buckets:
+                    b.consume(now)
+                return 0
+            return wait
+
+    def acquire(self, url, max_wait=None):
+        """Blocks until the request fits in its buckets. Returns False if that would take more than max_wait."""
+        start = time.monotonic()
+        with self.cond:
+            while True:
+                wait = self.try_acquire(url)
+                if wait <= 0:
+                    return True
+                if max_wait is not None and (time.monotonic() - start) + wait > max_wait:
+                    return False
+                self.cond.wait(wait)
+
+    def update(self, url, headers):
+        """Reads X-App-Rate-Limit / X-Method-Rate-Limit (and their -Count) from a Riot response."""
+        with self.cond:
+            now = time.monotonic()
+            app_bucket, method_bucket = self._buckets(url)
+            for bucket, prefix in ((app_bucket, "X-App-Rate-Limit"), (method_bucket, "X-Method-Rate-Limit")):
+                limits = parse_rate_limits(headers.get(prefix))
+                if limits:
+                    bucket.set_limits(limits)
+                bucket.sync(parse_rate_limits(headers.get(f"{prefix}-Count")), now)
+            self.cond.notify_all()
+
+    def on_rate_limited(self, url, retry_after, limit_type=None):
+        """After a 429, nobody uses the offending bucket until Retry-After has passed."""
+        with self.cond:
+            app_bucket, method_bucket = self._buckets(url)
+            bucket = app_bucket if limit_type == "application" else method_bucket
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after)
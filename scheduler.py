@@ -0,0 +1,119 @@
+"""Background refresh of the leaderboard roster so page loads are (almost) always cache reads.
+
+Refreshes each roster player before its cache entry stops being fresh, oldest data first and
+players on a streak ahead of the rest, spacing the work so it fits in Riot's app rate limit.
+
+- Inside the app: set ROSTER_SCHEDULER=1 and a daemon thread runs a pass every SCHEDULER_INTERVAL s.
+- Serverless / cron: call /api/cron/refresh (Vercel Cron) or run `python scheduler.py --once`.
+  The endpoint requires CRON_SECRET (Vercel sends it as "Authorization: Bearer ..."). vercel.json
+  runs it once a day, the most the Hobby plan allows; on Pro it can run every few minutes
+  ("*/10 * * * *") to actually keep the roster fresh.
+  A separate process does not share the in-memory cache, but it keeps the match store and the
+  incremental state on disk up to date, so the next web refresh costs a single call.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+
+from app import (
+    PLAYER_CACHE, PLAYER_FLIGHT, RIOT_LIMITER, CACHE_DURATION, MATCH_STORE, ACCOUNT_TTL, run_player_pipeline,
+)
+
+ROSTER_FILE = os.environ.get('ROSTER_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roster.json'))
+SCHEDULER_INTERVAL = int(os.environ.get('SCHEDULER_INTERVAL', 300))
+REFRESH_AHEAD = 0.75  # Refrescamos cuando la entrada ha gastado el 75% de CACHE_DURATION
+CALLS_PER_REFRESH = 14  # Peor caso: account + summoner + league + match-ids + 10 partidas
+STREAK_BONUS = CACHE_DURATION / 2  # Un jugador en racha "envejece" media hora antes
+
+_SCHEDULER_THREAD = None
+
+def load_roster(path=ROSTER_FILE):
+    """[(name, tag), ...] from the roster JSON (same players as index.html)."""
+    with open(path) as f:
+        return [(p.get('name') or p.get('summonerName'), p.get('tag')) for p in json.load(f)]
+
+def data_age(cache_key):
+    """(age, data) of a player's last refresh: the cache entry, else the state on disk. (None, {}) if never."""
+    age = PLAYER_CACHE.age(cache_key)
+    if age is not None:
+        return age, PLAYER_CACHE.get_fresh(cache_key) or {}
+    # Instancia en frío (cron en serverless): la última vez que se guardó su estado incremental
+    account = MATCH_STORE.get_account(cache_key, ACCOUNT_TTL)
+    state = MATCH_STORE.get_player_state(account[0]) if account else None
+    if state:
+        return time.time() - state['refreshed_at'], state['data']
+    return None, {}
+
+def refresh_queue(roster):
+    """Roster players due for a refresh, most urgent first."""
+    queue = []
+    for name, tag in roster:
+        cache_key = f"{name.lower()}#{tag.lower()}"
+        age, data = data_age(cache_key)
+        if age is None:
+            queue.append((float('inf'), name, tag))
+            continue
+        priority = age + (STREAK_BONUS if data.get('streak') else 0)
+        if priority >= CACHE_DURATION * REFRESH_AHEAD:
+            queue.append((priority, name, tag))
+    queue.sort(key=lambda item: item[0], reverse=True)
+    return [(name, tag) for _, name, tag in queue]
+
+def refresh_spacing():
+    """Seconds between refreshes so a full refresh per player stays under the tightest app limit."""
+    limits = RIOT_LIMITER.default_app_limits
+    if not limits:
+        return 0
+    return max(window / amount for amount, window in limits) * CALLS_PER_REFRESH
+
+def run_once(roster=None, max_players=None, spacing=None):
+    """One scheduler pass. Returns the list of refreshed 'name#tag'."""
+    roster = roster if roster is not None else load_roster()
+    spacing = refresh_spacing() if spacing is None else spacing
+    queue = refresh_queue(roster)[:max_players]
+
+    refreshed = []
+    for i, (name, tag) in enumerate(queue):
+        if i and spacing:
+            time.sleep(spacing)
+        cache_key = f"{name.lower()}#{tag.lower()}"
+        _, status = PLAYER_FLIGHT.do(cache_key, run_player_pipeline, name, tag, force=True)
+        print(f"[SCHEDULER] Refreshed {name}#{tag}: {status}")
+        refreshed.append(f"{name}#{tag}")
+    return refreshed
+
+def scheduler_loop():
+    while True:
+        try:
+            run_once()
+        except Exception as err:
+            print(f"[SCHEDULER] Pass failed: {err}")
+        time.sleep(SCHEDULER_INTERVAL)
+
+def start_scheduler():
+    """Starts the in-app scheduler thread (once per process)."""
+    global _SCHEDULER_THREAD
+    if _SCHEDULER_THREAD is None:
+        _SCHEDULER_THREAD = threading.Thread(target=scheduler_loop, name="roster-scheduler", daemon=True)
+        _SCHEDULER_THREAD.start()
+        print(f"[SCHEDULER] Started (every {SCHEDULER_INTERVAL}s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the roster cache warm.")
+    parser.add_argument('--once', action='store_true', help='Run a single pass and exit (cron)')
+    parser.add_argument('--max-players', type=int, help='Refresh at most N players per pass')
+    parser.add_argument('--roster', default=ROSTER_FILE, help='Roster JSON file')
+    args = parser.parse_args(argv)
+
+    roster = load_roster(args.roster)
+    if args.once:
+        run_once(roster, max_players=args.max_players)
+        return
+    while True:
+        run_once(roster, max_players=args.max_players)
+        time.sleep(SCHEDULER_INTERVAL)
+
+if __name__ == '__main__':
+    main()
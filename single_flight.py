@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from deadline import remaining
+
+# --- SINGLE-FLIGHT ---
+# Si varias peticiones piden lo mismo a la vez (mismo jugador, misma URL de Riot), sólo la
+# primera hace el trabajo y el resto espera y recibe el mismo resultado. Quien espera no lo hace
+# más allá del deadline de su petición (ver deadline.py): el líder puede no tener ninguno.
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call (threads and asyncio)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # key -> concurrent.futures.Future (motor de hilos)
+        self.tasks = {}  # key -> asyncio.Task (motor async)
+
+    def do(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs), or the result of the same call already in flight.
+
+        Raises concurrent.futures.TimeoutError if the caller's deadline runs out while waiting.
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+
+        if not leader:
+            left = remaining()
+            return future.result(timeout=None if left is None else max(0.0, left))
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """Async do(). Raises asyncio.TimeoutError if the caller's deadline runs out while waiting."""
+        task = self.tasks.get(key)
+        leader = task is None
+        if leader:
+            # La tarea hereda el contexto (y el deadline) del líder
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            self.tasks[key] = task
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+        # shield: si un llamante se cancela (o se le acaba el deadline) no cancelamos el trabajo de los demás
+        left = remaining()
+        if leader or left is None:
+            return await asyncio.shield(task)
+        return await asyncio.wait_for(asyncio.shield(task), max(0.0, left))